@@ -37,9 +37,11 @@ document.addEventListener('DOMContentLoaded', () => {
     const chatMessages = document.getElementById('chat-messages');
     const chatInput = document.getElementById('chat-input');
     const newChatButton = document.querySelector('.new-chat');
+    const finalizeButton = document.querySelector('.finalize-image');
     const chatArchiveSection = document.getElementById('chat-archive'); // Selector for the chat archive section
     let isWaitingForBot = false;
     let is_new_chat = false;
+    let sessionId = null; // Session of the current conversation on the server
 
     // Add loader during bot response
     function showLoader() {
@@ -117,6 +119,7 @@ newChatButton.addEventListener('click', async () => {
             "Content-Type": "application/json",
         },
     });
+    sessionId = (await response.json()).session_id;
     is_new_chat=true;
     promptSection.style.display = 'none'; // Hide the prompt section
     chatView.style.display = 'block'; // Show the chat view
@@ -126,6 +129,34 @@ newChatButton.addEventListener('click', async () => {
 });
 
 
+    // Replies are quick previews; render the full-quality image of the conversation on demand
+    finalizeButton.addEventListener('click', async () => {
+        if (!sessionId || isWaitingForBot) return;
+        isWaitingForBot = true;
+        showLoader();
+        try {
+            const response = await fetch("http://127.0.0.1:8000/finalize_conversation/", {
+                method: "POST",
+                headers: {
+                    "Content-Type": "application/json",
+                },
+                body: JSON.stringify({ session_id: sessionId }),
+            });
+            if (!response.ok) {
+                throw new Error('Error finalizing image: ' + response.statusText);
+            }
+            const blob = await response.blob();
+            removeLoader();
+            displayImage(URL.createObjectURL(blob));
+        } catch (error) {
+            console.error('Failed to finalize image:', error);
+            alert('Failed to render the final image. Please try again later.');
+            removeLoader();
+        } finally {
+            isWaitingForBot = false;
+        }
+    });
+
     // Event listener for the initial prompt
     promptInput.addEventListener('keydown', async (e) => {
         if (e.key === 'Enter' && promptInput.value.trim() !== '' && !isWaitingForBot) {
@@ -149,11 +180,12 @@ newChatButton.addEventListener('click', async () => {
                     headers: {
                         "Content-Type": "application/json",
                     },
-                    body: JSON.stringify({ user_input: promptInput.value }),
+                    body: JSON.stringify({ user_input: promptInput.value, session_id: sessionId, preview: true }),
                 });
 
                 // Handle bot response
                 if (response.ok) {
+                    sessionId = response.headers.get("X-Session-Id");
                     const blob = await response.blob();
                     const imageUrl = URL.createObjectURL(blob);
                     removeLoader();  // Remove typing indicator
@@ -190,12 +222,13 @@ newChatButton.addEventListener('click', async () => {
                             headers: {
                                 "Content-Type": "application/json",
                             },
-                            body: JSON.stringify({ user_input: userMessage }), // Changed to use userMessage instead of promptInput.value
+                            body: JSON.stringify({ user_input: userMessage, session_id: sessionId, preview: true }), // Changed to use userMessage instead of promptInput.value
                         });
 
                         if (!response.ok) {
                             throw new Error('Error starting conversation: ' + response.statusText);
                         }
+                        sessionId = response.headers.get("X-Session-Id");
 
                         const blob = await response.blob();
                         const imageUrl = URL.createObjectURL(blob);
@@ -214,7 +247,7 @@ newChatButton.addEventListener('click', async () => {
                             headers: {
                                 "Content-Type": "application/json",
                             },
-                            body: JSON.stringify({ user_input: userMessage }), // Send userMessage instead of promptInput.value
+                            body: JSON.stringify({ user_input: userMessage, session_id: sessionId, preview: true }), // Send userMessage instead of promptInput.value
                         });
 
                         if (!response.ok) {
@@ -23,6 +23,25 @@ const planetTextures = {
     icy: []
 };
 const textureLoader = new THREE.TextureLoader();
+
+// Load the smallest generated texture level first, then swap in the full-size image
+function loadProgressiveTexture(planet, result) {
+    const widths = Object.keys(result.textures || {}).map(Number).sort((a, b) => a - b);
+    let fullLoaded = false;
+    if (widths.length > 1) {
+        textureLoader.load(result.textures[widths[0]], (texture) => {
+            if (fullLoaded) return;
+            planet.material.map = texture;
+            planet.material.needsUpdate = true;
+        });
+    }
+    textureLoader.load(result.img_url, (texture) => {
+        fullLoaded = true;
+        planet.material.map = texture;
+        planet.material.needsUpdate = true;  // To ensure Three.js updates the material with the new texture
+    });
+}
+
 const backgroundTexture = textureLoader.load('assets/milkyway.jpg');
 
 camera.position.z = 60;
@@ -47,6 +66,8 @@ let planets = [];
 let orbits = [];
 let planetSpeeds = [];
 let currentStar = null;
+let ephemeris = null; // Keplerian positions of the current system, see fetchEphemeris
+const EPHEMERIS_SAMPLES = 2048;
 // Function to load random planet textures
 function getRandomTexture(folderPath) {
     const textures = [
@@ -362,12 +383,8 @@ async function displayPlanetInfo(planetData) {
                     const imageUrl = result.img_url; // Assuming the server returns { "imageUrl": "link-to-image.png" }
                     console.log(imageUrl); // Add this to see the exact image URL returned
     
-                    // Now load the texture to the selected planet
-                    const textureLoader = new THREE.TextureLoader();
-                    textureLoader.load(imageUrl, (texture) => {
-                        selectedPlanet.material.map = texture;
-                        selectedPlanet.material.needsUpdate = true;  // To ensure Three.js updates the material with the new texture
-                    });
+                    // Now load the texture to the selected planet, smallest level first
+                    loadProgressiveTexture(selectedPlanet, result);
                     console.log("Image successfully loaded");
                 } else {
                     console.error("Error:", response.statusText);
@@ -442,39 +459,94 @@ for (let i = 0; i < numStars; i++) {
 // Call the function to create stars
 // createStars(2000); // You can adjust the number of stars here
 
-// Fetch and load exoplanetary data
-async function fetchSystemData() {
+// Fetch a planetary system from the backend on demand and keep it in the map
+async function fetchSystemData(hostName) {
+    if (planetarySystems.has(hostName)) {
+        return planetarySystems.get(hostName);
+    }
     try {
-        const response = await fetch('planets.json');
+        const response = await fetch(`http://127.0.0.1:8000/systems/${encodeURIComponent(hostName)}`);
+        if (!response.ok) {
+            return null;
+        }
         const data = await response.json();
-        
-        // Organize the data into the map
-        data.forEach(system => {
-            if (!planetarySystems.has(system.star_name)) {
-                planetarySystems.set(system.star_name, []);
-            }
-            planetarySystems.get(system.star_name).push(system);
-        });
-        
-        // Set initial heading and info text
-        document.querySelector('.heading').textContent = 'Exoplanetary System';
-        document.getElementById('planet-info').textContent = 'Just type any exoplanet star name to display the system.';
+        planetarySystems.set(hostName, data.planets);
+        return data.planets;
     } catch (error) {
         console.error('Error fetching system data:', error);
+        return null;
     }
 }
 
-fetchSystemData();
+// Fetch precomputed Keplerian positions for a system as a Float32Array laid out as
+// [planet][sample][x, y] in AU; positions are scaled onto each planet's display orbit
+async function fetchEphemeris(hostName, systemData) {
+    try {
+        const response = await fetch(`http://127.0.0.1:8000/ephemeris/${encodeURIComponent(hostName)}?samples=${EPHEMERIS_SAMPLES}`);
+        if (!response.ok) {
+            return null;
+        }
+        return {
+            positions: new Float32Array(await response.arrayBuffer()),
+            sampleCount: Number(response.headers.get('X-Sample-Count')),
+            axes: systemData.map(planetData => planetData.semi_major_axis_au),
+            sample: 0
+        };
+    } catch (error) {
+        console.error('Error fetching ephemeris:', error);
+        return null;
+    }
+}
+
+// Set initial heading and info text
+document.querySelector('.heading').textContent = 'Exoplanetary System';
+document.getElementById('planet-info').textContent = 'Just type any exoplanet star name to display the system.';
 
 
 // Input event listener for searching a planetary system by host star name
 const input = document.getElementById('hostNameInput');
-input.addEventListener('keypress', (event) => {
+const suggestionList = document.getElementById('hostNameSuggestions');
+// Suggested name -> host star name, so picking a planet opens its system
+const suggestedStars = new Map();
+let suggestionTimer = null;
+
+// Fetch star and planet name suggestions as the user types (debounced)
+input.addEventListener('input', () => {
+    clearTimeout(suggestionTimer);
+    const query = input.value.trim();
+    if (query.length < 2) {
+        return;
+    }
+    suggestionTimer = setTimeout(async () => {
+        try {
+            const response = await fetch(`http://127.0.0.1:8000/search?q=${encodeURIComponent(query)}`);
+            if (!response.ok) {
+                return;
+            }
+            const data = await response.json();
+            suggestionList.innerHTML = '';
+            data.results.forEach(result => {
+                suggestedStars.set(result.name, result.star_name);
+                const option = document.createElement('option');
+                option.value = result.name;
+                option.label = result.type === 'planet' ? `Planet of ${result.star_name}` : 'Star';
+                suggestionList.appendChild(option);
+            });
+        } catch (error) {
+            console.error('Error fetching suggestions:', error);
+        }
+    }, 150);
+});
+
+input.addEventListener('keypress', async (event) => {
     if (event.key === 'Enter') {
-        const hostName = input.value.trim();
-        if (planetarySystems.has(hostName)) {
-            const systemData = planetarySystems.get(hostName);
+        const name = input.value.trim();
+        const hostName = suggestedStars.get(name) || name;
+        const systemData = await fetchSystemData(hostName);
+        if (systemData) {
+            ephemeris = null;
             setupSystem(systemData); // Setup the 3D visualization
+            ephemeris = await fetchEphemeris(hostName, systemData);
             displaySystemInfo(systemData); // Display system information
         } else {
             alert('System not found.');
@@ -488,7 +560,22 @@ function animate() {
     if (!isAnimating) return;
     requestAnimationFrame(animate);
 
+    if (ephemeris) {
+        ephemeris.sample = (ephemeris.sample + 1) % ephemeris.sampleCount;
+    }
     planets.forEach((planet, index) => {
+        // Follow the real eccentric orbit when the backend knows it
+        if (ephemeris && ephemeris.axes[index]) {
+            const offset = (index * ephemeris.sampleCount + ephemeris.sample) * 2;
+            const x = ephemeris.positions[offset];
+            if (!Number.isNaN(x)) {
+                const scale = planet.distance / ephemeris.axes[index];
+                planet.mesh.position.x = x * scale;
+                planet.mesh.position.z = ephemeris.positions[offset + 1] * scale;
+                return;
+            }
+        }
+
         // Increase the angle over time (based on speed)
         planet.angle += planetSpeeds[index];
 
@@ -712,12 +799,8 @@ function displayStarInfo(starName){
                     const imageUrl = result.img_url; // Assuming the server returns { "imageUrl": "link-to-image.png" }
                     console.log(imageUrl); // Add this to see the exact image URL returned
     
-                    // Now load the texture to the selected planet
-                    const textureLoader = new THREE.TextureLoader();
-                    textureLoader.load(imageUrl, (texture) => {
-                        selectedPlanet.material.map = texture;
-                        selectedPlanet.material.needsUpdate = true;  // To ensure Three.js updates the material with the new texture
-                    });
+                    // Now load the texture to the selected planet, smallest level first
+                    loadProgressiveTexture(selectedPlanet, result);
                     console.log("Image successfully loaded");
                 } else {
                     console.error("Error:", response.statusText);
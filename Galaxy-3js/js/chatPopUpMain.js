@@ -33,58 +33,27 @@
                 typingIndicator.style.display = "flex"; // Use flex to keep the dots in a row
 
     
-                // Assuming you have a way to get the current thread ID
-                if (firstMessage) {
-                    try {
-                        const response = await fetch("http://127.0.0.1:8000/message/", {
-                            method: "POST",
-                            headers: {
-                                "Content-Type": "application/json",
-                            },
-                            body: JSON.stringify({ message: message }),
-                        });
-    
-                        if (!response.ok) {
-                            throw new Error('Network response was not ok');
-                        }
-    
-                        const data = await response.json();
-                        const answer = data.assistant_response;
-                        currentThreadId = data.id;
-                        firstMessage = false;
-                        addResponse(answer); // Add the response to the chat
-                    } catch (error) {
-                        console.error('Error fetching response:', error);
-                        addResponse('An error occurred. Please try again later.');
-                    } finally {
-                        // Hide the typing indicator after the response is received
-                        typingIndicator.style.display = "none";
-                    }
-                } else {
-                    try {
-                        const response = await fetch("http://127.0.0.1:8000/message/", {
-                            method: "POST",
-                            headers: {
-                                "Content-Type": "application/json",
-                            },
-                            body: JSON.stringify({ message: message, id: currentThreadId }),
-                        });
-    
-                        if (!response.ok) {
-                            throw new Error('Network response was not ok');
-                        }
-    
-                        const data = await response.json();
-                        const answer = data.assistant_response;
-                        currentThreadId = data.id;
-                        addResponse(answer);
-                    } catch (error) {
-                        console.error('Error fetching response:', error);
-                        addResponse('An error occurred. Please try again later.');
-                    } finally {
-                        // Hide the typing indicator after the response is received
-                        typingIndicator.style.display = "none";
+                try {
+                    // Stream the answer so it appears while the assistant is still writing
+                    const response = await fetch("http://127.0.0.1:8000/message/stream", {
+                        method: "POST",
+                        headers: {
+                            "Content-Type": "application/json",
+                        },
+                        body: JSON.stringify(firstMessage ? { message: message } : { message: message, id: currentThreadId }),
+                    });
+
+                    if (!response.ok) {
+                        throw new Error('Network response was not ok');
                     }
+
+                    await readResponseStream(response, typingIndicator);
+                } catch (error) {
+                    console.error('Error fetching response:', error);
+                    addResponse('An error occurred. Please try again later.');
+                } finally {
+                    // Hide the typing indicator after the response is received
+                    typingIndicator.style.display = "none";
                 }
                 firstMessage = false;
             }
@@ -116,3 +85,50 @@ function addResponse(response) {
     chatBody.appendChild(responseElement); // Add response to chat body
     chatBody.scrollTop = chatBody.scrollHeight; // Scroll to the bottom
 }
+
+// Read the Server-Sent Events of /message/stream and render the answer as it arrives
+async function readResponseStream(response, typingIndicator) {
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let answer = "";
+    let responseElement = null;
+
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+
+        // Events are separated by a blank line
+        let boundary;
+        while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const rawEvent = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+
+            let eventName = "message";
+            let data = "";
+            for (const line of rawEvent.split("\n")) {
+                if (line.startsWith("event: ")) eventName = line.slice(7);
+                if (line.startsWith("data: ")) data += line.slice(6);
+            }
+            const payload = JSON.parse(data);
+
+            if (eventName === "done") {
+                currentThreadId = payload.id;
+            } else if (eventName === "error") {
+                currentThreadId = payload.id;
+                throw new Error(payload.detail);
+            } else {
+                answer += payload.delta;
+                if (!responseElement) {
+                    typingIndicator.style.display = "none";
+                    addResponse(answer);
+                    responseElement = chatBody.lastElementChild;
+                } else {
+                    responseElement.innerHTML = marked.parse(answer);
+                    chatBody.scrollTop = chatBody.scrollHeight;
+                }
+            }
+        }
+    }
+}
@@ -0,0 +1,72 @@
+import os
+import json
+import hashlib
+import threading
+from src_py.SharedFiles import write_atomic, file_lock
+
+# Location of the local registry, overridable from the environment
+ASSISTANT_REGISTRY_PATH = os.getenv('ASSISTANT_REGISTRY_PATH', '.assistant_registry.json')
+
+
+def file_digest(path, chunk_size=1024 * 1024):
+    """Return the SHA-256 hex digest of a file's contents."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def registry_key(data_path, config, account=''):
+    """
+    Key a remote assistant by the content of its data file, its configuration and the account
+    it lives in (e.g. API key and organization), so any change to them produces a new key.
+    Only the hash is stored, never the account credentials.
+    """
+    config_json = json.dumps(config, sort_keys=True)
+    payload = f"{file_digest(data_path)}:{config_json}:{account}"
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class AssistantRegistry:
+    """
+    Local JSON record of the remote file and assistant IDs created for each registry key, so
+    restarts reuse existing remote objects instead of uploading and creating new ones.
+    Entries are grouped by assistant name so the objects a changed entry replaces can be found.
+    """
+
+    def __init__(self, path=ASSISTANT_REGISTRY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def lock(self):
+        """
+        Context manager serializing the lookup, creation and recording of remote objects across
+        worker processes, so only one of them creates an assistant for a new key.
+        """
+        return file_lock(f"{self.path}.lock")
+
+    def _load(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, name, key):
+        """Return the entry recorded for an assistant name if it matches the key, else None."""
+        entry = self._load().get(name)
+        if entry and entry.get('key') == key:
+            return entry
+        return None
+
+    def previous(self, name):
+        """Return the entry currently recorded for an assistant name, whatever its key."""
+        return self._load().get(name)
+
+    def set(self, name, key, file_id, assistant_id):
+        """Record the remote IDs for an assistant name and key."""
+        with self._lock:
+            entries = self._load()
+            entries[name] = {'key': key, 'file_id': file_id, 'assistant_id': assistant_id}
+            write_atomic(self.path, json.dumps(entries, indent=2), mode='w')
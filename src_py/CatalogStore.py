@@ -0,0 +1,134 @@
+import json
+import numpy as np
+from src_py.ColumnarFile import ColumnTable, encode_strings, source_stamp, load_or_build_table
+from src_py.DerivedPhysics import DERIVED_COLUMNS, HostStars, derive_columns
+
+# Exoplanet catalogue shared with the frontend and the chatbot
+CATALOG_PATH = 'Data/planets.json'
+
+STRING_COLUMNS = ('planet_name', 'star_name', 'discovery_method')
+NUMERIC_COLUMNS = (
+    'orbital_period', 'planet_radius', 'planet_mass', 'star_temperature', 'star_radius',
+    'star_mass', 'orbital_eccentricity', 'planet_temperature', 'system_distance', 'discovery_year'
+)
+INTEGER_COLUMNS = ('discovery_year',)  # Stored as float so missing values can be NaN
+COLUMNS = (
+    'planet_name', 'star_name', 'orbital_period', 'planet_radius', 'planet_mass', 'star_temperature',
+    'star_radius', 'star_mass', 'orbital_eccentricity', 'planet_temperature', 'system_distance',
+    'discovery_method', 'discovery_year'
+)
+
+
+def build_catalog_table(path=CATALOG_PATH):
+    """
+    Parse the JSON catalogue into a ColumnTable with rows sorted by star_name, so every
+    planetary system occupies one contiguous row range.
+    """
+    with open(path, 'rb') as f:
+        records = json.load(f)
+    records.sort(key=lambda record: record['star_name'])
+    numeric = {
+        column: np.array([np.nan if record[column] is None else record[column] for record in records], dtype=np.float64)
+        for column in NUMERIC_COLUMNS
+    }
+    strings = {column: encode_strings([record[column] or '' for record in records]) for column in STRING_COLUMNS}
+    return ColumnTable(numeric, strings, source_stamp(path))
+
+
+def build_derived_table(path=CATALOG_PATH):
+    """
+    Compute the derived physics (see DerivedPhysics.DERIVED_COLUMNS) for every catalogue row,
+    row-aligned with the catalogue table and stamped with the same source file.
+    """
+    catalog = load_or_build_table(path, build_catalog_table)
+    return ColumnTable(derive_columns(catalog.numeric), {}, catalog.meta)
+
+
+class CatalogStore:
+    """
+    Column-oriented copy of the exoplanet catalogue, memory-mapped from its binary build.
+    Rows are sorted by star_name so every planetary system occupies one contiguous row range,
+    looked up through `systems`. The derived physics columns are mapped from their own binary
+    table next to the catalogue's and served as ordinary numeric columns.
+    """
+
+    def __init__(self, path=CATALOG_PATH):
+        self.path = path
+        table = load_or_build_table(path, build_catalog_table)
+        # Identifies this version of the dataset in ETags
+        self.version = table.meta['source_digest'][:16]
+        self.numeric = dict(table.numeric)
+        self.numeric.update(load_or_build_table(path, build_derived_table, suffix='.derived').numeric)
+        self.strings = table.strings
+        self._string_codes = {column: {value: code for code, value in enumerate(values)}
+                              for column, (_, values) in self.strings.items()}
+
+        # star_name -> (start, stop) row range
+        star_codes, star_values = self.strings['star_name']
+        boundaries = np.flatnonzero(star_codes[1:] != star_codes[:-1]) + 1
+        starts = np.concatenate(([0], boundaries))
+        stops = np.concatenate((boundaries, [len(star_codes)]))
+        self.systems = {star_values[star_codes[start]]: (int(start), int(stop)) for start, stop in zip(starts, stops)}
+
+        # One row per star whose temperature, radius and mass are all known, for the generator
+        complete = np.isfinite(self.numeric['star_temperature'][starts])
+        for column in ('star_radius', 'star_mass'):
+            complete &= np.isfinite(self.numeric[column][starts])
+        host_rows = starts[complete]
+        self.host_stars = HostStars(
+            [star_values[code] for code in star_codes[host_rows].tolist()],
+            self.numeric['star_temperature'][host_rows],
+            self.numeric['star_radius'][host_rows],
+            self.numeric['star_mass'][host_rows],
+            self.numeric['star_luminosity'][host_rows],
+            self.numeric['hz_inner_au'][host_rows],
+            self.numeric['hz_outer_au'][host_rows]
+        )
+
+    def __len__(self):
+        return len(self.strings['star_name'][0])
+
+    def rows(self, indices):
+        """Materialize the given row indices (or a slice) as JSON-ready dicts in catalogue order."""
+        selected = {}
+        for column, (codes, values) in self.strings.items():
+            selected[column] = [values[code] for code in codes[indices].tolist()]
+        for column, values in self.numeric.items():
+            selected[column] = [None if np.isnan(value) else value for value in values[indices].tolist()]
+        for column in INTEGER_COLUMNS:
+            selected[column] = [None if value is None else int(value) for value in selected[column]]
+        columns = COLUMNS + DERIVED_COLUMNS
+        return [dict(zip(columns, row)) for row in zip(*(selected[column] for column in columns))]
+
+    def system(self, star_name):
+        """Return the planets orbiting a star, or None if the star is unknown."""
+        row_range = self.systems.get(star_name)
+        if row_range is None:
+            return None
+        return self.rows(slice(*row_range))
+
+    def query(self, equals=None, ranges=None, limit=100, offset=0):
+        """
+        Filter the catalogue with exact matches on string columns and (min, max) bounds on
+        numeric columns; either bound may be None. Returns the total match count and one page
+        of rows.
+        """
+        mask = np.ones(len(self), dtype=bool)
+        for column, value in (equals or {}).items():
+            if column == 'star_name':
+                # Systems are contiguous, so a star filter is a plain row range
+                start, stop = self.systems.get(value, (0, 0))
+                star_mask = np.zeros(len(self), dtype=bool)
+                star_mask[start:stop] = True
+                mask &= star_mask
+            else:
+                # Compare integer codes instead of strings
+                mask &= self.strings[column][0] == self._string_codes[column].get(value, -1)
+        for column, (low, high) in (ranges or {}).items():
+            values = self.numeric[column]
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        matches = np.flatnonzero(mask)
+        return len(matches), self.rows(matches[offset:offset + limit])
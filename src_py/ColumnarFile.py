@@ -0,0 +1,170 @@
+import os
+import json
+import mmap
+import struct
+import hashlib
+import numpy as np
+from src_py.SharedFiles import atomic_write
+
+# File layout:
+#   magic (8 bytes) | header length (uint32, little-endian) | JSON header | aligned column blocks
+# Numeric columns are little-endian float64 arrays. String columns are uint32 codes into a
+# per-column string table, stored as uint32 end offsets followed by the UTF-8 blob.
+MAGIC = b'PLCOL\x00\x01\x00'
+ALIGNMENT = 64
+NUMERIC_DTYPE = np.dtype('<f8')
+CODE_DTYPE = np.dtype('<u4')
+
+
+class ColumnTable:
+    """
+    Typed columns of one dataset: float64 `numeric` arrays and dictionary-encoded `strings`
+    given as (codes, values) pairs. `meta` records the source file the table was built from.
+    """
+
+    def __init__(self, numeric, strings, meta=None):
+        self.numeric = numeric
+        self.strings = strings
+        self.meta = meta or {}
+
+    def __len__(self):
+        for values in self.numeric.values():
+            return len(values)
+        for codes, _ in self.strings.values():
+            return len(codes)
+        return 0
+
+    def string_column(self, name):
+        """Decode a string column into an object array."""
+        codes, values = self.strings[name]
+        return np.array(values, dtype=object)[codes]
+
+
+def encode_strings(values):
+    """Dictionary-encode a sequence of strings into (codes, distinct values in first-seen order)."""
+    table = {}
+    codes = np.fromiter((table.setdefault(value, len(table)) for value in values), dtype=CODE_DTYPE, count=len(values))
+    return codes, list(table)
+
+
+def source_stamp(source_path):
+    """Describe a source file so a table built from it can be checked for staleness cheaply."""
+    stat = os.stat(source_path)
+    with open(source_path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    return {'source_size': stat.st_size, 'source_mtime_ns': stat.st_mtime_ns, 'source_digest': digest}
+
+
+def _pad(f):
+    f.write(b'\x00' * (-f.tell() % ALIGNMENT))
+
+
+def write_table(path, table):
+    """Write a ColumnTable to `path` atomically."""
+    blocks = []
+    columns = []
+    for name, values in table.numeric.items():
+        columns.append({'name': name, 'kind': 'numeric', 'block': len(blocks)})
+        blocks.append(np.ascontiguousarray(values, dtype=NUMERIC_DTYPE).tobytes())
+    for name, (codes, values) in table.strings.items():
+        encoded = [value.encode('utf-8') for value in values]
+        ends = np.cumsum([len(value) for value in encoded], dtype=np.uint64).astype(CODE_DTYPE)
+        columns.append({'name': name, 'kind': 'string', 'block': len(blocks), 'table_size': len(values)})
+        blocks.append(np.ascontiguousarray(codes, dtype=CODE_DTYPE).tobytes())
+        blocks.append(ends.tobytes())
+        blocks.append(b''.join(encoded))
+
+    # Offsets are relative to the start of the data section, which begins on an aligned boundary
+    offsets = []
+    position = 0
+    for block in blocks:
+        offsets.append((position, len(block)))
+        position += len(block) + (-len(block) % ALIGNMENT)
+    header = json.dumps({'rows': len(table), 'columns': columns, 'blocks': offsets, 'meta': table.meta}).encode('utf-8')
+
+    with atomic_write(path) as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header)))
+        f.write(header)
+        _pad(f)
+        for block in blocks:
+            f.write(block)
+            _pad(f)
+
+
+def read_table(path):
+    """
+    Memory-map a table written by write_table. Numeric columns and string codes are zero-copy
+    views on the mapping, so every process reading the same file shares its pages.
+    """
+    with open(path, 'rb') as f:
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapping[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path} is not a columnar dataset file")
+    (header_length,) = struct.unpack_from('<I', mapping, len(MAGIC))
+    header_start = len(MAGIC) + 4
+    header = json.loads(bytes(mapping[header_start:header_start + header_length]))
+    data_start = header_start + header_length
+    data_start += -data_start % ALIGNMENT
+    rows = header['rows']
+
+    def block(index, dtype=None, count=-1):
+        offset, length = header['blocks'][index]
+        if dtype is None:
+            return mapping[data_start + offset:data_start + offset + length]
+        return np.frombuffer(mapping, dtype=dtype, count=count, offset=data_start + offset)
+
+    numeric = {}
+    strings = {}
+    for column in header['columns']:
+        if column['kind'] == 'numeric':
+            numeric[column['name']] = block(column['block'], NUMERIC_DTYPE, rows)
+        else:
+            codes = block(column['block'], CODE_DTYPE, rows)
+            ends = block(column['block'] + 1, CODE_DTYPE, column['table_size'])
+            blob = block(column['block'] + 2)
+            starts = np.concatenate(([0], ends[:-1]))
+            values = [blob[start:end].decode('utf-8') for start, end in zip(starts.tolist(), ends.tolist())]
+            strings[column['name']] = (codes, values)
+    return ColumnTable(numeric, strings, header['meta'])
+
+
+def binary_path_for(source_path, suffix=''):
+    """
+    Path of the binary table built from a source file, e.g. Data/planets.json -> Data/planets.bin.
+    Further tables derived from the same source are told apart by `suffix` (Data/planets.derived.bin).
+    """
+    return os.path.splitext(source_path)[0] + suffix + '.bin'
+
+
+def load_fresh_table(source_path, suffix=''):
+    """
+    Memory-map the binary table of a source file if it exists and was built from the file's
+    current size and modification time; otherwise return None.
+    """
+    path = binary_path_for(source_path, suffix)
+    try:
+        table = read_table(path)
+        stat = os.stat(source_path)
+    except (FileNotFoundError, ValueError):
+        return None
+    if table.meta.get('source_size') != stat.st_size or table.meta.get('source_mtime_ns') != stat.st_mtime_ns:
+        return None
+    return table
+
+
+def load_or_build_table(source_path, build, suffix=''):
+    """
+    Memory-map the binary table of a source file if it is up to date. Otherwise build it with
+    `build(source_path)` and write it out first, so the next process can map it directly.
+    """
+    table = load_fresh_table(source_path, suffix)
+    if table is None:
+        table = build(source_path)
+        path = binary_path_for(source_path, suffix)
+        try:
+            write_table(path, table)
+            table = read_table(path)
+        except OSError:
+            pass  # Read-only deployments keep the freshly built copy
+    return table
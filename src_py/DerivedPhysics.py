@@ -0,0 +1,91 @@
+import numpy as np
+
+# Physical constants
+G = 6.67430e-11  # Gravitational constant in m^3 kg^-1 s^-2
+EARTH_MASS = 5.972e24  # Earth mass in kg
+EARTH_RADIUS = 6371000  # Earth radius in meters
+EARTH_GRAVITY = 9.807  # Earth surface gravity in m/s^2
+AU_IN_METERS = 149.6e9  # One astronomical unit in meters
+SECONDS_PER_YEAR = 365.25 * 24 * 3600
+SUN_TEMPERATURE = 5778  # Effective temperature of the Sun in Kelvin
+SOLAR_RADIUS_AU = 0.00465047  # One solar radius in astronomical units
+
+# Stellar flux (relative to Earth's) at the inner and outer habitable-zone edges
+HZ_INNER_FLUX = 1.1
+HZ_OUTER_FLUX = 0.53
+BOND_ALBEDO = 0.3  # Earth-like albedo assumed for equilibrium temperatures
+
+# Columns of the derived table, one value per catalogue row (NaN where an input is missing)
+DERIVED_COLUMNS = (
+    'surface_gravity', 'star_luminosity', 'hz_inner_au', 'hz_outer_au', 'semi_major_axis_au',
+    'equilibrium_temperature'
+)
+
+
+def surface_gravity(mass_earth, radius_earth):
+    """Surface gravity in Earth g from planet mass (Earth masses) and radius (Earth radii)."""
+    return (G * mass_earth * EARTH_MASS) / (radius_earth * EARTH_RADIUS) ** 2 / EARTH_GRAVITY
+
+
+def stellar_luminosity(star_radius, star_temperature):
+    """Luminosity in solar units from stellar radius (solar radii) and temperature (Kelvin)."""
+    return star_radius ** 2 * (star_temperature / SUN_TEMPERATURE) ** 4
+
+
+def habitable_zone(luminosity):
+    """Inner and outer habitable-zone bounds in AU for a star of the given luminosity."""
+    return np.sqrt(luminosity / HZ_INNER_FLUX), np.sqrt(luminosity / HZ_OUTER_FLUX)
+
+
+def semi_major_axis(orbital_period_days, star_mass):
+    """Orbital distance in AU from Kepler's third law, with the star mass in solar masses."""
+    return np.cbrt(star_mass * (orbital_period_days / 365.25) ** 2)
+
+
+def equilibrium_temperature(star_temperature, star_radius, distance_au, albedo=BOND_ALBEDO):
+    """Planetary equilibrium temperature in Kelvin, assuming full heat redistribution."""
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return star_temperature * np.sqrt(star_radius * SOLAR_RADIUS_AU / (2 * distance_au)) * (1 - albedo) ** 0.25
+
+
+def derive_columns(numeric):
+    """Compute every derived column for whole catalogue columns in one vectorized pass."""
+    star_temperature = np.asarray(numeric['star_temperature'], dtype=np.float64)
+    star_radius = np.asarray(numeric['star_radius'], dtype=np.float64)
+    luminosity = stellar_luminosity(star_radius, star_temperature)
+    hz_inner, hz_outer = habitable_zone(luminosity)
+    distance = semi_major_axis(np.asarray(numeric['orbital_period'], dtype=np.float64),
+                               np.asarray(numeric['star_mass'], dtype=np.float64))
+    return {
+        'surface_gravity': surface_gravity(np.asarray(numeric['planet_mass'], dtype=np.float64),
+                                           np.asarray(numeric['planet_radius'], dtype=np.float64)),
+        'star_luminosity': luminosity,
+        'hz_inner_au': hz_inner,
+        'hz_outer_au': hz_outer,
+        'semi_major_axis_au': distance,
+        'equilibrium_temperature': equilibrium_temperature(star_temperature, star_radius, distance)
+    }
+
+
+class HostStars:
+    """
+    Arrays describing candidate host stars for generated planets: name, temperature (K),
+    radius and mass (solar units) plus the luminosity (solar units) and habitable-zone bounds
+    (AU) already derived for them, e.g. by derive_columns.
+    """
+
+    def __init__(self, names, temperature, radius, mass, luminosity, hz_inner, hz_outer):
+        self.names = np.asarray(names, dtype=object)
+        self.temperature = np.asarray(temperature, dtype=np.float64)
+        self.radius = np.asarray(radius, dtype=np.float64)
+        self.mass = np.asarray(mass, dtype=np.float64)
+        self.luminosity = np.asarray(luminosity, dtype=np.float64)
+        self.hz_inner = np.asarray(hz_inner, dtype=np.float64)
+        self.hz_outer = np.asarray(hz_outer, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.names)
+
+    def sample(self, count, rng):
+        """Draw `count` host stars uniformly at random; returns their row indices."""
+        return rng.integers(0, len(self), size=count)
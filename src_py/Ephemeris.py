@@ -0,0 +1,50 @@
+import numpy as np
+
+# Newton iterations stop once every eccentric anomaly moved less than this (radians)
+KEPLER_TOLERANCE = 1e-10
+KEPLER_MAX_ITERATIONS = 50
+MAX_ECCENTRICITY = 0.99  # Keeps Newton's method well conditioned for near-parabolic orbits
+
+# Positions are little-endian float32 so browsers can wrap the body in a Float32Array directly
+POSITION_DTYPE = np.dtype('<f4')
+
+
+def solve_kepler(mean_anomaly, eccentricity):
+    """
+    Solve Kepler's equation M = E - e sin E for the eccentric anomaly E with Newton iterations
+    over whole arrays at once. `eccentricity` broadcasts against `mean_anomaly`.
+    """
+    mean_anomaly = np.mod(mean_anomaly, 2 * np.pi)
+    eccentricity = np.broadcast_to(eccentricity, mean_anomaly.shape)
+    # Starting at pi converges for every eccentricity; M is closer for near-circular orbits
+    anomaly = np.where(eccentricity < 0.8, mean_anomaly, np.pi)
+    for _ in range(KEPLER_MAX_ITERATIONS):
+        step = (anomaly - eccentricity * np.sin(anomaly) - mean_anomaly) / (1 - eccentricity * np.cos(anomaly))
+        anomaly -= step
+        if np.all(np.abs(step) < KEPLER_TOLERANCE):
+            break
+    return anomaly
+
+
+def orbit_positions(semi_major_axis, period, eccentricity, times):
+    """
+    Positions of every planet at every time, in AU in the orbital plane with the star at the
+    origin and periastron on the +x axis at time 0. `semi_major_axis`, `period` and
+    `eccentricity` hold one value per planet (period in the same unit as `times`). Returns
+    an array of shape (planets, times, 2); planets with an unknown orbit get NaN positions.
+    """
+    semi_major_axis = np.asarray(semi_major_axis, dtype=np.float64)[:, None]
+    period = np.asarray(period, dtype=np.float64)[:, None]
+    eccentricity = np.clip(np.nan_to_num(np.asarray(eccentricity, dtype=np.float64), nan=0.0), 0.0, MAX_ECCENTRICITY)[:, None]
+    times = np.asarray(times, dtype=np.float64)[None, :]
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_anomaly = 2 * np.pi * times / period
+    known = np.isfinite(mean_anomaly)
+    anomaly = solve_kepler(np.where(known, mean_anomaly, 0.0), eccentricity)
+
+    positions = np.empty(anomaly.shape + (2,), dtype=np.float64)
+    positions[..., 0] = semi_major_axis * (np.cos(anomaly) - eccentricity)
+    positions[..., 1] = semi_major_axis * np.sqrt(1 - eccentricity ** 2) * np.sin(anomaly)
+    positions[~known] = np.nan
+    return positions
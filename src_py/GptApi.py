@@ -1,36 +1,146 @@
 from dotenv import load_dotenv, find_dotenv
 load_dotenv(find_dotenv())
 import os
-import requests
+import httpx
 import json
+import base64
+import logging
 import numpy as np
-import pandas as pd
-from PIL import Image
-from io import BytesIO
+from src_py.HttpClient import get_async_client, download_bytes
+from src_py.PlanetIndex import QuantileIndex
+from src_py.ImageWorkers import image_pool
+from src_py.PlanetGenerator import estimate_planet_parameters_batch, map_features_to_text_batch
+from src_py.Metrics import span, timed
+from src_py.SingleFlight import SingleFlight
+from src_py.RateGovernor import (
+    UpstreamError, chat_governor, image_governor, estimate_tokens, raise_for_upstream_status
+)
+
+logger = logging.getLogger(__name__)
+
+# Progressive preview settings, overridable from the environment. Previews use an image model
+# that can edit its previous output, at its cheapest quality; the final image is an edit of the
+# last preview at full quality, or a fresh dall-e-3 render when there is no preview.
+PREVIEW_IMAGE_MODEL = os.getenv('PREVIEW_IMAGE_MODEL', 'gpt-image-1')
+PREVIEW_IMAGE_QUALITY = os.getenv('PREVIEW_IMAGE_QUALITY', 'low')
+FINAL_IMAGE_QUALITY = os.getenv('FINAL_IMAGE_QUALITY', 'high')
+PREVIEW_IMAGE_SIZE = os.getenv('PREVIEW_IMAGE_SIZE', '1024x1024')
+PREVIEW_IMAGE_FORMAT = 'jpeg'  # Far smaller than PNG, which matters for the stored previews
+
+# Instruction sent with the previous preview when the user adds something to the planet
+PREVIEW_EDIT_TEMPLATE = (
+    "Keep the planet, its colors, surface and the composition of this image unchanged, "
+    "and add [addition]. don't generate any shadows in this picture."
+)
+
+# Instruction sent with the last preview when the conversation is finalized
+PREVIEW_FINALIZE_PROMPT = (
+    "Render this image again in full detail and sharpness, keeping the planet, its colors, surface "
+    "and the composition unchanged. don't generate any shadows in this picture."
+)
+
+# Identical descriptions parsed concurrently share one chat completion
+description_flight = SingleFlight('parse_planet_description')
+
+
+def total_tokens(body):
+    """Token usage reported in a chat completion body, if any."""
+    return (body.get('usage') or {}).get('total_tokens')
+
+
+def is_unavailable(error):
+    """Whether an UpstreamError means OpenAI is rate limiting or down, rather than rejecting the request."""
+    return error.status_code == 429 or error.status_code >= 500
 
 class PlanetAssistant:
     def __init__(self):
         self.api_url_chat = "https://api.openai.com/v1/chat/completions"
         self.api_url_image = "https://api.openai.com/v1/images/generations"
+        self.api_url_image_edit = "https://api.openai.com/v1/images/edits"
         self.api_key = os.environ['OPENAI_API_KEY']  # Ensure the API key is set in your environment variables
         self.headers = {
             "Authorization": f"Bearer {self.api_key}",
             "Content-Type": "application/json"
         }
         self.conversation_state = {}  # To store conversation context and features
+        self.rng = np.random.default_rng()  # Per-assistant random state for parameter sampling
+
+    def _post(self, url, data_json):
+        """
+        POST to the OpenAI API and return the decoded body, raising UpstreamError on failure.
+        """
+        import requests  # Only the blocking helpers use it; the server goes through httpx
+        try:
+            response = requests.post(url, headers=self.headers, data=data_json)
+        except requests.RequestException as e:
+            raise UpstreamError(503, f"OpenAI request failed: {e}")
+        raise_for_upstream_status(response)
+        return response.json()
+
+    async def _post_async(self, url, data_json):
+        """
+        Non-blocking variant of _post that goes through the shared connection pool.
+        """
+        try:
+            response = await get_async_client().post(url, headers=self.headers, content=data_json)
+        except httpx.TransportError as e:
+            raise UpstreamError(503, f"OpenAI request failed: {e}")
+        raise_for_upstream_status(response)
+        return response.json()
+
+    async def _post_multipart_async(self, url, data, files):
+        """
+        Variant of _post_async for multipart uploads such as image edits.
+        """
+        headers = {"Authorization": self.headers["Authorization"]}  # httpx sets the multipart boundary
+        try:
+            response = await get_async_client().post(url, headers=headers, data=data, files=files)
+        except httpx.TransportError as e:
+            raise UpstreamError(503, f"OpenAI request failed: {e}")
+        raise_for_upstream_status(response)
+        return response.json()
 
     def send_request(self, data_json):
         """
         Send a request to the OpenAI API with the provided JSON data for chat completions.
+        Calls go through the shared rate governor; UpstreamError is raised once retries run out.
         """
-        response = requests.post(self.api_url_chat, headers=self.headers, data=data_json)
-        return response.json()['choices'][0]['message']['content']
+        body = chat_governor.call_sync(
+            lambda: self._post(self.api_url_chat, data_json), tokens=estimate_tokens(data_json), usage=total_tokens
+        )
+        return body['choices'][0]['message']['content']
 
+    async def send_request_async(self, data_json):
+        """
+        Non-blocking variant of send_request.
+        """
+        body = await chat_governor.call(
+            lambda: self._post_async(self.api_url_chat, data_json), tokens=estimate_tokens(data_json), usage=total_tokens
+        )
+        return body['choices'][0]['message']['content']
+
+    @timed('parse_planet_description')
     def parse_planet_description(self, user_input):
         """
         Generate a JSON structure to parse user input about a planet and get a structured response.
         """
-        data = json.dumps({
+        return self.send_request(self._planet_description_payload(user_input))
+
+    @timed('parse_planet_description')
+    async def parse_planet_description_async(self, user_input):
+        """
+        Non-blocking variant of parse_planet_description. Concurrent calls with the same input
+        share one upstream request.
+        """
+        return await description_flight.do(
+            user_input, self.send_request_async, self._planet_description_payload(user_input)
+        )
+
+    def _planet_description_payload(self, user_input):
+        """
+        Build the chat completion payload used to parse user input about a planet.
+        """
+        return json.dumps({
             "model": "gpt-4o-mini",
             "messages": [
                 {
@@ -61,127 +171,46 @@ class PlanetAssistant:
                 }
             }
         })
-        return self.send_request(data)
 
-    def estimate_planet_parameters(self, features, data):
+    @timed('estimate_planet_parameters')
+    def estimate_planet_parameters(self, features, data, hosts=None):
         """
         Estimate comprehensive planetary parameters based on user-defined features and dataset quantiles.
+        `data` is a QuantileIndex over the planet dataset and `hosts` the real stars to orbit.
         """
         features = json.loads(features)
-
-        # Constants
-        R_star = 1.0  # Assuming solar radii
-        T_star = 5780  # Assuming solar temperature in Kelvin
-        G = 6.67430e-11  # Gravitational constant in m^3 kg^-1 s^-2
-        earth_radius = 6371000  # Earth radius in meters
-        au_in_meters = 149.6e9  # One astronomical unit in meters
-
-        # Determine quantile ranges and mass and period ranges
-        quantiles = {
-            'small': (0.0, 0.25),
-            'medium': (0.25, 0.75),
-            'large': (0.75, 1.0)
-        }
-
-        size = features.get('planet_size', 'medium').lower()
-        quantile_range = quantiles[size]
-        mass_range = data['pl_bmasse'].quantile(quantile_range)
-        period_range = data['pl_orbper'].quantile(quantile_range)
-
-        # Random selection within the quantile range for mass in Earth masses
-        planet_mass_earth_masses = np.random.uniform(mass_range.iloc[0], mass_range.iloc[1])
-        planet_mass = planet_mass_earth_masses * 5.972e24  # Convert Earth masses to kg
-
-        # Calculate gravity and radius
-        planet_radius = earth_radius * (planet_mass / 5.972e24) ** (1 / 3)  # Scale radius based on mass
-        gravity = (G * planet_mass) / (planet_radius ** 2)
-        gravity_normalized = gravity / 9.807  # Normalize by Earth's gravity
-
-        # Orbital period and distance calculations
-        orbital_period_days = np.random.uniform(period_range.iloc[0], period_range.iloc[1])
-        orbital_period_years = orbital_period_days / 365.25
-        orbital_distance = np.sqrt(G * planet_mass * (orbital_period_years * 365.25 * 24 * 3600) ** 2 / (4 * np.pi ** 2))
-        orbital_distance_au = orbital_distance / au_in_meters
-
-        # Calculate stellar luminosity and habitable zone
-        L_star = (R_star ** 2) * ((T_star / 5778) ** 4)
-        inner_boundary = np.sqrt(L_star / 1.1)
-        outer_boundary = np.sqrt(L_star / 0.53)
-
-        # Determine habitability
-        habitable = inner_boundary <= orbital_distance_au <= outer_boundary
-
-        # Approximate temperature based on user input or distance from the star
-        temperature_estimation = {
-            "cold": "< 250K",
-            "temperate": "250K - 350K",
-            "hot": "> 350K"
-        }
+        planets = estimate_planet_parameters_batch([features], data, n=1, rng=self.rng, hosts=hosts)
 
         # Round numerical values for more readable output
         return {
-            'planet_size': size,
-            'planet_type': features.get('type', 'unknown'),
-            'planet_color': features.get('color', 'unknown'),
-            'approximate_temperature': temperature_estimation.get(features.get('temperature', 'temperate'), 'unknown'),
-            'approximate_mass_earth_masses': round(planet_mass_earth_masses, 2),
-            'gravity_earth_g': round(gravity_normalized, 2),
-            'orbital_period_years': round(orbital_period_years, 2),
-            'orbital_distance_au': round(orbital_distance_au, 2),
-            'habitable': habitable
+            'planet_size': str(planets['planet_size'][0]),
+            'planet_type': str(planets['planet_type'][0]),
+            'planet_color': str(planets['planet_color'][0]),
+            'approximate_temperature': str(planets['approximate_temperature'][0]),
+            'approximate_mass_earth_masses': round(float(planets['approximate_mass_earth_masses'][0]), 2),
+            'gravity_earth_g': round(float(planets['gravity_earth_g'][0]), 2),
+            'orbital_period_years': round(float(planets['orbital_period_years'][0]), 2),
+            'orbital_distance_au': round(float(planets['orbital_distance_au'][0]), 2),
+            'habitable': bool(planets['habitable'][0]),
+            'host_star': str(planets['host_star'][0]),
+            'star_temperature': round(float(planets['star_temperature'][0]), 2),
+            'star_luminosity': round(float(planets['star_luminosity'][0]), 4),
+            'equilibrium_temperature': round(float(planets['equilibrium_temperature'][0]), 2)
         }
 
     def map_features_to_text(self, features):
         """
         Convert numeric features to more general textual descriptions to avoid DALL-E generating text.
         """
-        # Mapping mass to descriptive terms
-        if features['approximate_mass_earth_masses'] < 1:
-            mass_description = "smaller than Earth"
-        elif 1 <= features['approximate_mass_earth_masses'] <= 5:
-            mass_description = "similar in mass to Earth"
-        else:
-            mass_description = "much larger than Earth"
-
-        # Mapping gravity to descriptive terms
-        if features['gravity_earth_g'] < 1:
-            gravity_description = "weaker gravity than Earth"
-        elif 1 <= features['gravity_earth_g'] <= 1.5:
-            gravity_description = "similar to Earth's gravity"
-        else:
-            gravity_description = "stronger gravity than Earth"
-
-        # Mapping orbital period to descriptive terms
-        if features['orbital_period_years'] < 1:
-            orbital_period_description = "a quick orbit around its star"
-        elif 1 <= features['orbital_period_years'] <= 5:
-            orbital_period_description = "a moderate orbit around its star"
-        else:
-            orbital_period_description = "a long orbit around its star"
-
-        # Mapping temperature to descriptive terms
-        temperature_description = features.get('approximate_temperature', 'temperate climate')
-
-        # Mapping distance to descriptive terms
-        if features['orbital_distance_au'] < 1:
-            distance_description = "very close to its star"
-        elif 1 <= features['orbital_distance_au'] <= 2:
-            distance_description = "moderately distant from its star"
-        else:
-            distance_description = "far from its star"
-
-        # Habitability description
-        habitability_description = "located in the habitable zone" if features[
-            'habitable'] else "outside the habitable zone"
-
-        return {
-            "mass": mass_description,
-            "gravity": gravity_description,
-            "orbital_period": orbital_period_description,
-            "temperature": temperature_description,
-            "distance": distance_description,
-            "habitability": habitability_description
-        }
+        descriptions = map_features_to_text_batch({
+            'approximate_mass_earth_masses': [features['approximate_mass_earth_masses']],
+            'gravity_earth_g': [features['gravity_earth_g']],
+            'orbital_period_years': [features['orbital_period_years']],
+            'approximate_temperature': [features.get('approximate_temperature', 'temperate climate')],
+            'orbital_distance_au': [features['orbital_distance_au']],
+            'habitable': [features['habitable']]
+        })
+        return {key: str(value[0]) for key, value in descriptions.items()}
 
     def get_dalle_prompt(self):
         """
@@ -225,27 +254,105 @@ class PlanetAssistant:
         # Append the new addition to the 'additional_features' list
         self.conversation_state['features']['additional_features'].append(addition)
 
+    @timed('generate_dalle_image')
     def generate_dalle_image(self, prompt, size="1024x1024", n=1):
         """
         Generate an image using DALL-E based on the prompt.
         """
-        data = json.dumps({
+        data = self._dalle_payload(prompt, size, n)
+        try:
+            response_data = image_governor.call_sync(lambda: self._post(self.api_url_image, data))
+        except UpstreamError as e:
+            if is_unavailable(e):
+                raise
+            logger.warning("Failed to generate image: %s", e.detail)
+            return None
+        return response_data['data'][0]['url']
+
+    @timed('generate_dalle_image')
+    async def generate_dalle_image_async(self, prompt, size="1024x1024", n=1):
+        """
+        Non-blocking variant of generate_dalle_image.
+        """
+        data = self._dalle_payload(prompt, size, n)
+        try:
+            response_data = await image_governor.call(lambda: self._post_async(self.api_url_image, data))
+        except UpstreamError as e:
+            if is_unavailable(e):
+                raise
+            logger.warning("Failed to generate image: %s", e.detail)
+            return None
+        return response_data['data'][0]['url']
+
+    def _dalle_payload(self, prompt, size, n):
+        """
+        Build the image generation payload for DALL-E.
+        """
+        return json.dumps({
             "model": "dall-e-3",
             "prompt": prompt,
             "size": size,
             "quality": "standard",
             "n": n
         })
-        response = requests.post(self.api_url_image, headers=self.headers, data=data)
 
-        if response.status_code == 200:
-            response_data = response.json()
-            return response_data['data'][0]['url']
-        else:
-            print("Failed to generate image:", response.text)
+    def _preview_params(self, quality=PREVIEW_IMAGE_QUALITY):
+        """
+        Model, quality, size and format shared by preview generations and edits.
+        """
+        return {
+            "model": PREVIEW_IMAGE_MODEL,
+            "quality": quality,
+            "size": PREVIEW_IMAGE_SIZE,
+            "output_format": PREVIEW_IMAGE_FORMAT
+        }
+
+    async def _preview_request(self, send):
+        """
+        Run a preview request through the image governor and return the decoded image bytes,
+        or None if OpenAI rejected it.
+        """
+        try:
+            response_data = await image_governor.call(send)
+        except UpstreamError as e:
+            if is_unavailable(e):
+                raise
+            logger.warning("Failed to generate preview: %s", e.detail)
             return None
+        return base64.b64decode(response_data['data'][0]['b64_json'])
+
+    @timed('generate_preview_image')
+    async def generate_preview_image_async(self, prompt):
+        """
+        Render a fast, low-quality preview of a prompt and return the image bytes.
+        """
+        data = json.dumps({"prompt": prompt, "n": 1, **self._preview_params()})
+        return await self._preview_request(lambda: self._post_async(self.api_url_image, data))
+
+    @timed('edit_preview_image')
+    async def edit_preview_image_async(self, image, addition):
+        """
+        Add something to a previous preview by editing it instead of regenerating the planet,
+        and return the new image bytes.
+        """
+        return await self._edit_image_async(image, PREVIEW_EDIT_TEMPLATE.replace('[addition]', addition))
 
-    def start_conversation(self, user_input, data):
+    @timed('finalize_preview_image')
+    async def finalize_preview_image_async(self, image):
+        """
+        Upgrade the last preview of a conversation to a full-quality image, keeping what the
+        user saw, and return the new image bytes.
+        """
+        return await self._edit_image_async(image, PREVIEW_FINALIZE_PROMPT, FINAL_IMAGE_QUALITY)
+
+    async def _edit_image_async(self, image, prompt, quality=PREVIEW_IMAGE_QUALITY):
+        data = {"prompt": prompt, "n": "1", **self._preview_params(quality)}
+        files = {"image": (f"preview.{PREVIEW_IMAGE_FORMAT}", image, f"image/{PREVIEW_IMAGE_FORMAT}")}
+        return await self._preview_request(
+            lambda: self._post_multipart_async(self.api_url_image_edit, data, files)
+        )
+
+    def start_conversation(self, user_input, data, hosts=None):
         """
         Start the conversation with the user by parsing initial features and generating a DALL-E prompt.
         """
@@ -253,13 +360,23 @@ class PlanetAssistant:
         features = self.parse_planet_description(user_input)
 
         # Step 2: Estimate additional parameters
-        detailed_parameters = self.estimate_planet_parameters(features, data)
+        detailed_parameters = self.estimate_planet_parameters(features, data, hosts)
 
         # Store the conversation state for future additions
         self.conversation_state = {
             'features': detailed_parameters
         }
 
+    async def start_conversation_async(self, user_input, data, hosts=None):
+        """
+        Non-blocking variant of start_conversation.
+        """
+        features = await self.parse_planet_description_async(user_input)
+        detailed_parameters = self.estimate_planet_parameters(features, data, hosts)
+        self.conversation_state = {
+            'features': detailed_parameters
+        }
+
     def continue_conversation(self, addition):
         """
         Continue the conversation by allowing the user to add elements to the DALL-E prompt.
@@ -277,59 +394,61 @@ class PlanetAssistant:
         image_url = self.generate_dalle_image(dalle_prompt)
         return image_url
 
-    def preprocess_dalle_image(self, image_url):
-        response = requests.get(image_url)
-        image = Image.open(BytesIO(response.content))
-
-        # Get image dimensions
-        width, height = image.size
-
-        # Desired aspect ratio and zoom level
-        aspect_ratio = 16 / 9  # Width:Height ratio
-        zoom_factor = 0.3  # Fraction of width to use (smaller value = more zoom)
-
-        # Calculate crop dimensions
-        crop_width = width * zoom_factor
-        crop_height = crop_width / aspect_ratio
-
-        # Ensure crop_height does not exceed the original height
-        if crop_height > height:
-            crop_height = height
-            crop_width = crop_height * aspect_ratio
-
-        shift_y = 0
-        shift_x = 0
-
-        # Calculate coordinates
-        left = (width - crop_width) / 2 + shift_x
-        top = (height - crop_height) / 2 + shift_y
-        right = left + crop_width
-        bottom = top + crop_height
+    async def finalize_conversation_async(self):
+        """
+        Non-blocking variant of finalize_conversation.
+        """
+        return await self.generate_dalle_image_async(self.get_dalle_prompt())
 
-        # Ensure coordinates are within image bounds
-        left = max(0, left)
-        top = max(0, top)
-        right = min(width, right)
-        bottom = min(height, bottom)
+    async def preview_conversation_async(self, previous=None, addition=None):
+        """
+        Render a preview of the conversation's planet. With the previous preview and the latest
+        addition, the previous image is edited; otherwise the full prompt is rendered afresh.
+        finalize_preview_image_async upgrades the last preview to full quality later.
+        """
+        if previous and addition:
+            return await self.edit_preview_image_async(previous, addition)
+        return await self.generate_preview_image_async(self.get_dalle_prompt())
 
-        # Crop the image
-        cropped_image = image.crop((left, top, right, bottom))
+    def preprocess_dalle_image(self, image_url):
+        import requests
+        with span('image_download'):
+            response = requests.get(image_url)
+        with span('preprocess_dalle_image'):
+            return self.crop_dalle_image(response.content)
 
-        cropped_image.save("processed_image.png")
+    async def preprocess_dalle_image_levels_async(self, image_url):
+        """
+        Download a DALL-E image and run the in-memory texture pipeline on it. Returns a list of
+        (width, encoded bytes) pairs from largest to smallest, or None if the download failed.
+        """
+        with span('image_download'):
+            content = await download_bytes(image_url)
+        if content is None:
+            return None
+        # Imported here so Pillow is only loaded by the first image request, not at startup
+        from src_py.ImagePipeline import process_dalle_image
+        with span('preprocess_dalle_image'):
+            return await image_pool.run(process_dalle_image, content)
 
-        return cropped_image
+    def crop_dalle_image(self, content):
+        """
+        Decode the raw DALL-E image bytes in memory and crop them to the texture aspect ratio.
+        """
+        from src_py.ImagePipeline import decode_and_crop
+        return decode_and_crop(content)
 
 # Example Usage
 
 
 if __name__ == '__main__':
-    df = pd.read_csv('Data/merged.csv')
+    index = QuantileIndex('Data/merged.csv')
     user_input = "I want a very big planet, it should be uneven and red."
 
     assistant = PlanetAssistant()
 
     # Start the conversation
-    assistant.start_conversation(user_input, df)
+    assistant.start_conversation(user_input, index)
 
 
     print(assistant.finalize_conversation())
@@ -1,98 +1,263 @@
 from dotenv import load_dotenv, find_dotenv
 
 load_dotenv(find_dotenv())
-from openai import OpenAI
+import os
+import asyncio
+import logging
+from collections import OrderedDict, deque
+import openai
+from openai import OpenAI, AsyncOpenAI
+from src_py.AssistantRegistry import AssistantRegistry, registry_key
+from src_py.Metrics import span
+from src_py.RateGovernor import UpstreamError, chat_governor, parse_retry_after
 
+logger = logging.getLogger(__name__)
+
+# The sync client only sets up the assistant; conversations go through the async client
 client = OpenAI()
+async_client = AsyncOpenAI(max_retries=0)  # Retries are left to the shared rate governor
+
+# Run concurrency and polling settings, overridable from the environment
+CHATBOT_MAX_RUNS = int(os.getenv('CHATBOT_MAX_RUNS', '64'))
+POLL_INITIAL_DELAY = 0.25  # Seconds before the first status check
+POLL_BACKOFF = 1.5  # Growth factor of the delay between checks
+POLL_MAX_DELAY = 2.0
+MESSAGE_CACHE_THREADS = int(os.getenv('MESSAGE_CACHE_THREADS', '1000'))  # Threads kept in the local cache
+MESSAGE_CACHE_MESSAGES = int(os.getenv('MESSAGE_CACHE_MESSAGES', '50'))  # Recent messages kept per thread
+RUN_TOKEN_ESTIMATE = int(os.getenv('CHATBOT_RUN_TOKEN_ESTIMATE', '2000'))  # Reserved per run until its usage is known
+
+# Data file shared with the assistant's code interpreter
+DATA_PATH = "Data/planets.json"
+
+# Assistant configuration; changing it creates a new remote assistant on the next start
+ASSISTANT_CONFIG = {
+    "name": "Educator",
+    "description": (
+        "You are an assistant for middle schoolers and high schoolers "
+        "who are interested in cosmos and exoplanets. Your messages "
+        "should always be enjoyable to read and not plain and boring. "
+        "Always explain everything that the student asks you."
+    ),
+    "model": "gpt-4o-mini",
+    "tools": [{"type": "code_interpreter"}]
+}
+
+async def governed(request, tokens=1):
+    """
+    Await an OpenAI SDK request through the shared rate governor, translating SDK errors into
+    UpstreamError so 429s are retried after their Retry-After period.
+    """
+    async def send():
+        try:
+            return await request()
+        except openai.APIStatusError as e:
+            raise UpstreamError(e.status_code, e.message, parse_retry_after(e.response.headers))
+        except openai.APIConnectionError as e:
+            raise UpstreamError(503, f"OpenAI request failed: {e}")
+    return await chat_governor.call(send, tokens=tokens)
+
+
+def account_identity():
+    """The API key, organization and project the client acts for, to key the assistant registry by."""
+    return f"{client.api_key}:{client.organization}:{client.project}"
+
+
+def run_tokens(run):
+    """Total tokens a finished run used, or None if it did not report usage."""
+    usage = getattr(run, 'usage', None)
+    return usage.total_tokens if usage else None
+
+
+def message_text(message):
+    """Join the text blocks of an assistant message."""
+    return "".join(block.text.value for block in message.content if block.type == 'text')
+
+class MessageCache:
+    """
+    Recent messages of each thread kept locally, so replies already fetched never have to be
+    listed again. Holds at most `max_messages` per thread and drops the least recently used
+    threads beyond `max_threads`.
+    """
+
+    def __init__(self, max_threads=MESSAGE_CACHE_THREADS, max_messages=MESSAGE_CACHE_MESSAGES):
+        self.max_threads = max_threads
+        self.max_messages = max_messages
+        self._threads = OrderedDict()  # thread_id -> deque of {"id", "role", "text"}
+
+    def add(self, thread_id, message_id, role, text):
+        """Record a message for a thread."""
+        messages = self._threads.get(thread_id)
+        if messages is None:
+            messages = self._threads[thread_id] = deque(maxlen=self.max_messages)
+        self._threads.move_to_end(thread_id)
+        messages.append({"id": message_id, "role": role, "text": text})
+        while len(self._threads) > self.max_threads:
+            self._threads.popitem(last=False)
+
+    def history(self, thread_id):
+        """Return the cached messages of a thread, oldest first."""
+        return list(self._threads.get(thread_id, ()))
 
 class Chatbot:
-    def __init__(self):
-        """Initialize the chatbot by uploading files and creating an assistant."""
-        # Upload the planets.json file for use by the assistant
-        file = client.files.create(
-            file=open("Data/planets.json", "rb"),
-            purpose='assistants'
-        )
-
-        # Create the assistant
-        self.assistant = client.beta.assistants.create(
-            name="Educator",
-            description=(
-                "You are an assistant for middle schoolers and high schoolers "
-                "who are interested in cosmos and exoplanets. Your messages "
-                "should always be enjoyable to read and not plain and boring. "
-                "Always explain everything that the student asks you."
-            ),
-            model="gpt-4o-mini",
-            tools=[{"type": "code_interpreter"}],
-            tool_resources={
-                "code_interpreter": {
-                    "file_ids": [file.id]
-                }
-            }
-        )
-        print(f"Assistant created with ID: {self.assistant.id}")
-
-        # Initialize thread_id to None
-        self.thread_id = None
-
-    def start_new_conversation(self):
-        """Start a new conversation thread."""
-        thread = client.beta.threads.create()
-        self.thread_id = thread.id
-        print(f"Started new conversation with thread ID: {self.thread_id}")
-        return self.thread_id
-
-    def set_thread_id(self, thread_id):
-        """Set the current thread ID to continue an existing conversation."""
-        self.thread_id = thread_id
-
-    def get_thread_id(self):
-        """Get the current thread ID."""
-        return self.thread_id
-
-    def send_message(self, user_message, thread_id=None):
-        """Send a message to the assistant within a thread."""
-        if thread_id is None:
-            if self.thread_id is None:
-                raise ValueError("No thread ID provided and no current thread set.")
-            thread_id = self.thread_id
-        else:
-            self.thread_id = thread_id  # Update current thread ID
+    def __init__(self, data_path=DATA_PATH, registry=None):
+        """
+        Initialize the chatbot, reusing the uploaded file and assistant recorded in the local
+        registry when neither the data file, the assistant configuration nor the account has
+        changed and the assistant still exists remotely.
+        """
+        registry = registry or AssistantRegistry()
+        name = ASSISTANT_CONFIG["name"]
+        key = registry_key(data_path, ASSISTANT_CONFIG, account_identity())
 
-        message = client.beta.threads.messages.create(
+        # Held across lookup, creation and recording so concurrent workers create one assistant
+        with registry.lock():
+            entry = registry.get(name, key)
+            self.assistant_id = None
+            if entry:
+                try:
+                    self.assistant_id = client.beta.assistants.retrieve(entry["assistant_id"]).id
+                    logger.info("Reusing assistant with ID: %s", self.assistant_id)
+                except (openai.NotFoundError, openai.PermissionDeniedError) as e:
+                    logger.warning("Recorded assistant %s is gone, creating a new one: %s", entry['assistant_id'], e)
+
+            previous = None
+            if self.assistant_id is None:
+                previous = registry.previous(name)
+
+                # Upload the planets.json file for use by the assistant
+                with open(data_path, "rb") as data_file:
+                    file = client.files.create(file=data_file, purpose='assistants')
+
+                # Create the assistant
+                assistant = client.beta.assistants.create(
+                    **ASSISTANT_CONFIG,
+                    tool_resources={
+                        "code_interpreter": {
+                            "file_ids": [file.id]
+                        }
+                    }
+                )
+                self.assistant_id = assistant.id
+                registry.set(name, key, file.id, assistant.id)
+                logger.info("Assistant created with ID: %s", self.assistant_id)
+
+        # Only remove objects that a different configuration or account left behind
+        if previous and previous.get("key") != key and previous.get("assistant_id") != self.assistant_id:
+            self._delete_remote(previous)
+
+        # Caps the number of assistant runs in flight from this process
+        self.run_slots = asyncio.Semaphore(CHATBOT_MAX_RUNS)
+        self.message_cache = MessageCache()
+
+    @staticmethod
+    def _delete_remote(entry):
+        """Best-effort removal of an assistant and file that a registry entry replaced."""
+        for delete, object_id in ((client.beta.assistants.delete, entry.get("assistant_id")),
+                                  (client.files.delete, entry.get("file_id"))):
+            try:
+                if object_id:
+                    delete(object_id)
+            except Exception as e:
+                logger.warning("Could not delete %s: %s", object_id, e)
+
+    async def start_new_conversation(self):
+        """Start a new conversation thread and return its ID."""
+        thread = await governed(async_client.beta.threads.create)
+        logger.info("Started new conversation with thread ID: %s", thread.id)
+        return thread.id
+
+    async def send_message(self, thread_id, user_message):
+        """Send a message to the assistant within a thread."""
+        message = await governed(lambda: async_client.beta.threads.messages.create(
             thread_id=thread_id,
             role="user",
             content=user_message
-        )
+        ))
+        self.message_cache.add(thread_id, message.id, "user", user_message)
         return message
 
-    def get_response(self, thread_id=None):
-        """Get the assistant's response using create_and_poll."""
-        if thread_id is None:
-            if self.thread_id is None:
-                raise ValueError("No thread ID provided and no current thread set.")
-            thread_id = self.thread_id
-        else:
-            self.thread_id = thread_id  # Update current thread ID
+    async def _wait_for_run(self, thread_id, run):
+        """Poll a run until it leaves the queued/in-progress states, backing off between polls."""
+        delay = POLL_INITIAL_DELAY
+        while run.status in ("queued", "in_progress", "cancelling"):
+            await asyncio.sleep(delay)
+            delay = min(delay * POLL_BACKOFF, POLL_MAX_DELAY)
+            run = await governed(lambda: async_client.beta.threads.runs.retrieve(run.id, thread_id=thread_id))
+        return run
+
+    async def get_response(self, thread_id):
+        """Run the assistant on a thread and return the text of its reply."""
+        async with self.run_slots:
+            with span('chatbot_run'):
+                run = await governed(lambda: async_client.beta.threads.runs.create(
+                    thread_id=thread_id,
+                    assistant_id=self.assistant_id,
+                ), tokens=RUN_TOKEN_ESTIMATE)
+                run = await self._wait_for_run(thread_id, run)
+            chat_governor.settle(RUN_TOKEN_ESTIMATE, run_tokens(run))
 
-        # Run the assistant and wait for completion
-        run = client.beta.threads.runs.create_and_poll(
-            thread_id=thread_id,
-            assistant_id=self.assistant.id,
-        )
         if run.status == 'completed':
-            # Retrieve all messages in the thread
-            messages_response = client.beta.threads.messages.list(
-                thread_id=thread_id
-            )
-            messages = messages_response.data  # Assuming messages are in the 'data' attribute
-            # Find the last assistant's response
-            assistant_messages = [m for m in messages if m.role == 'assistant']
-            if assistant_messages:
-                last_assistant_message = assistant_messages[0]
-                return last_assistant_message.content
+            # Fetch only the newest message this run produced, whatever the thread length
+            messages_response = await governed(lambda: async_client.beta.threads.messages.list(
+                thread_id=thread_id,
+                run_id=run.id,
+                order="desc",
+                limit=1
+            ))
+            if messages_response.data:
+                message = messages_response.data[0]
+                text = message_text(message)
+                self.message_cache.add(thread_id, message.id, "assistant", text)
+                return text
             else:
                 return "No assistant response found."
         else:
             return f"Run status: {run.status}"
+
+    async def stream_response(self, thread_id):
+        """Run the assistant and yield its reply as text deltas while the run progresses."""
+        async with self.run_slots:
+            with span('chatbot_run'):
+                # Only opening the stream is retried; a failure mid-reply reaches the caller
+                async def open_stream():
+                    manager = async_client.beta.threads.runs.stream(
+                        thread_id=thread_id,
+                        assistant_id=self.assistant_id,
+                    )
+                    return manager, await manager.__aenter__()
+
+                manager, stream = await governed(open_stream, tokens=RUN_TOKEN_ESTIMATE)
+                try:
+                    async for text in stream.text_deltas:
+                        yield text
+                    # The stream already carries the finished messages, so nothing needs listing
+                    for message in await stream.get_final_messages():
+                        if message.role == "assistant":
+                            self.message_cache.add(thread_id, message.id, "assistant", message_text(message))
+                    chat_governor.settle(RUN_TOKEN_ESTIMATE, run_tokens(await stream.get_final_run()))
+                finally:
+                    await manager.__aexit__(None, None, None)
+
+    async def history(self, thread_id):
+        """
+        Return the recent messages of a thread, oldest first. Only messages newer than the
+        newest cached one are listed, with its ID as the cursor, so the cost stays constant
+        however long the thread grows; an uncached thread lists just its latest page.
+        """
+        cached = self.message_cache.history(thread_id)
+        limit = self.message_cache.max_messages
+        if cached:
+            page = await governed(lambda: async_client.beta.threads.messages.list(
+                thread_id=thread_id, order="asc", after=cached[-1]["id"], limit=limit
+            ))
+            messages = page.data
+        else:
+            page = await governed(lambda: async_client.beta.threads.messages.list(
+                thread_id=thread_id, order="desc", limit=limit
+            ))
+            messages = list(reversed(page.data))
+        for message in messages:
+            if message.status == "in_progress":
+                break  # Cached once finished, so the cursor never skips the rest of the reply
+            self.message_cache.add(thread_id, message.id, message.role, message_text(message))
+        return self.message_cache.history(thread_id)
@@ -0,0 +1,70 @@
+import os
+import httpx
+
+# Limits and timeouts for the shared connection pool, overridable from the environment
+HTTP_TIMEOUT = float(os.getenv('HTTP_TIMEOUT', '120'))  # DALL-E calls regularly take 10-30 seconds
+HTTP_CONNECT_TIMEOUT = float(os.getenv('HTTP_CONNECT_TIMEOUT', '10'))
+HTTP_MAX_CONNECTIONS = int(os.getenv('HTTP_MAX_CONNECTIONS', '100'))
+HTTP_MAX_KEEPALIVE = int(os.getenv('HTTP_MAX_KEEPALIVE', '20'))
+HTTP_STREAM_CHUNK_SIZE = int(os.getenv('HTTP_STREAM_CHUNK_SIZE', str(64 * 1024)))
+
+_client = None
+
+
+def get_async_client():
+    """
+    Return the process-wide AsyncClient, creating it on first use so that every caller
+    shares one keep-alive connection pool.
+    """
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS,
+                max_keepalive_connections=HTTP_MAX_KEEPALIVE
+            )
+        )
+    return _client
+
+
+async def close_async_client():
+    """Close the shared AsyncClient and release its pooled connections."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+async def download_bytes(url):
+    """Download a URL through the shared pool and return the body, or None on a non-200 response."""
+    response = await get_async_client().get(url)
+    if response.status_code != 200:
+        return None
+    return response.content
+
+
+async def open_stream(url):
+    """
+    Start streaming a URL through the shared pool. Returns the open response, or None on a
+    non-200 status; the caller must relay it with relay_stream so the connection is released.
+    """
+    client = get_async_client()
+    response = await client.send(client.build_request('GET', url), stream=True)
+    if response.status_code != 200:
+        await response.aclose()
+        return None
+    return response
+
+
+async def relay_stream(response, chunk_size=HTTP_STREAM_CHUNK_SIZE):
+    """
+    Yield an open upstream response in chunks as they arrive, holding at most one chunk in
+    memory. The upstream connection is closed when the body ends, fails, or the client
+    disconnects and the generator is cancelled.
+    """
+    try:
+        async for chunk in response.aiter_bytes(chunk_size):
+            yield chunk
+    finally:
+        await response.aclose()
@@ -0,0 +1,132 @@
+import os
+import json
+import time
+import hashlib
+import threading
+from src_py.SharedFiles import write_atomic, remove_file
+
+# Cache settings, overridable from the environment
+IMAGE_CACHE_DIR = os.getenv('IMAGE_CACHE_DIR', 'cache/images')
+IMAGE_CACHE_MAX_BYTES = int(os.getenv('IMAGE_CACHE_MAX_BYTES', str(512 * 1024 * 1024)))
+IMAGE_CACHE_TTL = float(os.getenv('IMAGE_CACHE_TTL', str(7 * 24 * 3600)))  # Seconds before a variant is regenerated
+IMAGE_CACHE_VARIANTS = int(os.getenv('IMAGE_CACHE_VARIANTS', '1'))  # Variants served round-robin per key
+
+
+def cache_key(features, prompt_template):
+    """
+    Content address of a generated image: a hash of the normalized features and the prompt
+    template they are rendered into, so editing the template invalidates old entries.
+    """
+    payload = json.dumps({'features': features, 'template': prompt_template}, sort_keys=True)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+class ImageCache:
+    """
+    Disk-backed cache mapping a content key to the uploaded image URL, the URLs of its smaller
+    texture levels and the processed image bytes. Every key holds up to `variants` images that
+    are served round-robin once they are all generated. Entries older than `ttl` expire, and the least recently used keys are evicted
+    once the cache grows beyond `max_bytes`.
+    """
+
+    def __init__(self, directory=IMAGE_CACHE_DIR, max_bytes=IMAGE_CACHE_MAX_BYTES,
+                 ttl=IMAGE_CACHE_TTL, variants=IMAGE_CACHE_VARIANTS):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.variants = max(1, variants)
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _meta_path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _read_meta(self, key):
+        try:
+            with open(self._meta_path(key)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _drop_expired(self, meta, now):
+        """Remove variants older than the TTL from the metadata and from disk."""
+        fresh = []
+        for variant in meta['variants']:
+            if now - variant['created'] <= self.ttl:
+                fresh.append(variant)
+            else:
+                remove_file(os.path.join(self.directory, variant['file']))
+        meta['variants'] = fresh
+
+    def get(self, key):
+        """
+        Return the next cached variant for a key as a dict with `img_url`, `textures` and `content`,
+        or None when the key is missing or still has fewer than `variants` images stored.
+        """
+        now = time.time()
+        with self._lock:
+            meta = self._read_meta(key)
+            if meta is None:
+                return None
+            self._drop_expired(meta, now)
+            if len(meta['variants']) < self.variants:
+                write_atomic(self._meta_path(key), json.dumps(meta), mode='w')
+                return None
+            variant = meta['variants'][meta.get('next', 0) % len(meta['variants'])]
+            meta['next'] = (meta.get('next', 0) + 1) % len(meta['variants'])
+            # Rewriting the metadata also refreshes its mtime, which drives LRU eviction
+            write_atomic(self._meta_path(key), json.dumps(meta), mode='w')
+        try:
+            with open(os.path.join(self.directory, variant['file']), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+        return {'img_url': variant['img_url'], 'textures': variant.get('textures', {}), 'content': content}
+
+    def put(self, key, img_url, content, textures=None):
+        """Store a newly generated variant for a key and enforce the size limit."""
+        now = time.time()
+        with self._lock:
+            meta = self._read_meta(key) or {'variants': [], 'next': 0}
+            self._drop_expired(meta, now)
+            file_name = f"{key}-{int(now * 1000)}.img"
+            write_atomic(os.path.join(self.directory, file_name), content)
+            meta['variants'].append({'img_url': img_url, 'textures': textures or {}, 'file': file_name, 'created': now})
+            # Keep only the newest variants if more were produced than are served
+            for variant in meta['variants'][:-self.variants]:
+                remove_file(os.path.join(self.directory, variant['file']))
+            meta['variants'] = meta['variants'][-self.variants:]
+            write_atomic(self._meta_path(key), json.dumps(meta), mode='w')
+            self._evict()
+
+    def _evict(self):
+        """Delete least recently used keys until the cache fits in max_bytes."""
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith('.json'):
+                continue
+            key = name[:-len('.json')]
+            meta = self._read_meta(key)
+            if meta is None:
+                continue
+            size = 0
+            for variant in meta['variants']:
+                try:
+                    size += os.path.getsize(os.path.join(self.directory, variant['file']))
+                except FileNotFoundError:
+                    pass
+            try:
+                last_used = os.path.getmtime(self._meta_path(key))
+            except FileNotFoundError:
+                continue
+            entries.append((last_used, key, meta, size))
+            total += size
+
+        for _, key, meta, size in sorted(entries, key=lambda entry: entry[0]):
+            if total <= self.max_bytes:
+                break
+            for variant in meta['variants']:
+                remove_file(os.path.join(self.directory, variant['file']))
+            remove_file(os.path.join(self.directory, f"{key}.json"))
+            total -= size
@@ -0,0 +1,98 @@
+import os
+from io import BytesIO
+from PIL import Image
+
+# Texture output settings, overridable from the environment
+TEXTURE_MIN_WIDTH = int(os.getenv('TEXTURE_MIN_WIDTH', '128'))  # Smallest level of the texture chain
+TEXTURE_FORMAT = os.getenv('TEXTURE_FORMAT', 'PNG').upper()  # 'PNG' or 'WEBP'
+
+# Crop applied to every DALL-E image
+ASPECT_RATIO = 16 / 9  # Width:Height ratio
+ZOOM_FACTOR = 0.3  # Fraction of width to use (smaller value = more zoom)
+
+MEDIA_TYPES = {'PNG': 'image/png', 'WEBP': 'image/webp'}
+
+
+def decode_image(content):
+    """
+    Decode raw image bytes in memory.
+    """
+    image = Image.open(BytesIO(content))
+    image.load()
+    return image
+
+
+def crop_to_texture(image):
+    """
+    Crop the center of an image to the texture aspect ratio.
+    """
+    # Get image dimensions
+    width, height = image.size
+
+    # Calculate crop dimensions
+    crop_width = width * ZOOM_FACTOR
+    crop_height = crop_width / ASPECT_RATIO
+
+    # Ensure crop_height does not exceed the original height
+    if crop_height > height:
+        crop_height = height
+        crop_width = crop_height * ASPECT_RATIO
+
+    # Calculate coordinates, kept within image bounds
+    left = max(0, (width - crop_width) / 2)
+    top = max(0, (height - crop_height) / 2)
+    right = min(width, left + crop_width)
+    bottom = min(height, top + crop_height)
+
+    return image.crop((left, top, right, bottom))
+
+
+def decode_and_crop(content):
+    """Decode raw image bytes and crop them to the texture aspect ratio."""
+    return crop_to_texture(decode_image(content))
+
+
+def resize_to_width(image, width):
+    """
+    Downscale an image to the given width, keeping its aspect ratio. Whole-number factors are
+    handled with Image.reduce, which is much cheaper than a full resampling pass.
+    """
+    factor = image.width // width
+    if factor >= 2:
+        image = image.reduce(factor)
+    if image.width != width:
+        height = max(1, round(image.height * width / image.width))
+        image = image.resize((width, height), Image.LANCZOS)
+    return image
+
+
+def build_texture_levels(image, min_width=TEXTURE_MIN_WIDTH):
+    """
+    Build a mip-style chain of textures: the full image followed by repeated halvings of its
+    width, as long as they are at least `min_width` wide. Each level is downscaled from the
+    previous one. Returns (width, image) pairs from largest to smallest.
+    """
+    levels = [(image.width, image)]
+    while levels[-1][0] // 2 >= min_width:
+        width = levels[-1][0] // 2
+        levels.append((width, resize_to_width(levels[-1][1], width)))
+    return levels
+
+
+def encode_image(image, fmt=TEXTURE_FORMAT):
+    """Encode a PIL image in the given format and return the bytes."""
+    img_bytes = BytesIO()
+    if fmt == 'WEBP':
+        image.save(img_bytes, format='WEBP', quality=90, method=4)
+    else:
+        image.save(img_bytes, format=fmt)
+    return img_bytes.getvalue()
+
+
+def process_dalle_image(content, min_width=TEXTURE_MIN_WIDTH, fmt=TEXTURE_FORMAT):
+    """
+    Full in-memory pipeline for a downloaded DALL-E image: decode, crop and encode the chain of
+    texture levels. Returns a list of (width, encoded bytes) pairs from largest to smallest.
+    """
+    image = crop_to_texture(decode_image(content))
+    return [(width, encode_image(level, fmt)) for width, level in build_texture_levels(image, min_width)]
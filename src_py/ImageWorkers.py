@@ -0,0 +1,95 @@
+import os
+import time
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from src_py.Metrics import Histogram, Gauge, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Pool settings, overridable from the environment
+IMAGE_WORKERS = int(os.getenv('IMAGE_WORKERS', str(os.cpu_count() or 2)))
+IMAGE_QUEUE_SIZE = int(os.getenv('IMAGE_QUEUE_SIZE', str(IMAGE_WORKERS * 4)))  # Tasks running or waiting
+IMAGE_QUEUE_TIMEOUT = float(os.getenv('IMAGE_QUEUE_TIMEOUT', '5'))  # Seconds to wait for a free slot
+
+POOL_SECONDS = Histogram(
+    'planetebi_image_pool_task_seconds', 'Image pool queue wait and run time per task.', ('task', 'phase')
+)
+POOL_PENDING = Gauge('planetebi_image_pool_pending', 'Image pool tasks running or waiting for a worker.')
+REGISTRY.extend([POOL_SECONDS, POOL_PENDING])
+
+
+class PoolBusyError(Exception):
+    """Raised when the image pool queue stays full for longer than the queue timeout."""
+
+
+def _timed_call(fn, args):
+    """Run a task inside a worker process and report how long it ran there."""
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+class ImageWorkerPool:
+    """
+    Process pool for CPU-bound image transforms, so Pillow decoding and encoding run on every
+    core instead of holding the GIL in the request handler. At most `max_pending` tasks may be
+    queued or running; further callers wait up to `queue_timeout` seconds for a slot and then
+    get PoolBusyError. Queue wait and run time per task name go to the POOL_SECONDS histogram.
+    """
+
+    def __init__(self, max_workers=IMAGE_WORKERS, max_pending=IMAGE_QUEUE_SIZE, queue_timeout=IMAGE_QUEUE_TIMEOUT):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.queue_timeout = queue_timeout
+        self._executor = None
+        self._slots = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            # Spawned workers do not inherit the server's threads and open sockets
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+
+    async def run(self, fn, *args):
+        """
+        Run a picklable module-level function in the pool and return its result.
+        """
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        try:
+            await asyncio.wait_for(self._slots.acquire(), self.queue_timeout)
+        except asyncio.TimeoutError:
+            raise PoolBusyError("Image worker pool is busy") from None
+
+        POOL_PENDING.inc()
+        start = time.perf_counter()
+        try:
+            result, run_seconds = await asyncio.get_running_loop().run_in_executor(
+                self._get_executor(), _timed_call, fn, args
+            )
+        finally:
+            POOL_PENDING.dec()
+            self._slots.release()
+        total_seconds = time.perf_counter() - start
+        self._record(fn.__name__, total_seconds - run_seconds, run_seconds)
+        return result
+
+    def _record(self, name, wait_seconds, run_seconds):
+        POOL_SECONDS.observe(wait_seconds, name, 'wait')
+        POOL_SECONDS.observe(run_seconds, name, 'run')
+        logger.debug("%s waited %.3fs and ran %.3fs in the image pool", name, wait_seconds, run_seconds)
+
+    def shutdown(self):
+        """Stop the worker processes."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Shared pool used for all image transforms
+image_pool = ImageWorkerPool()
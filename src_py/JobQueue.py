@@ -0,0 +1,283 @@
+import os
+import json
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from src_py.Metrics import Histogram, Gauge, REGISTRY
+from src_py.SqliteDb import connect, create_schema
+
+logger = logging.getLogger(__name__)
+
+# Job queue settings, overridable from the environment
+JOB_BACKEND = os.getenv('JOB_BACKEND', 'memory')  # 'memory' or 'sqlite'
+JOB_DB_PATH = os.getenv('JOB_DB_PATH', 'jobs.sqlite3')
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', '4'))  # Jobs running at once in this process
+JOB_QUEUE_SIZE = int(os.getenv('JOB_QUEUE_SIZE', '100'))  # Queued jobs beyond this are rejected
+JOB_TIMEOUT = float(os.getenv('JOB_TIMEOUT', '300'))  # Seconds a job may run before it is failed
+JOB_TTL = float(os.getenv('JOB_TTL', '3600'))  # Seconds finished jobs are kept for polling
+
+QUEUED, RUNNING, SUCCEEDED, FAILED = 'queued', 'running', 'succeeded', 'failed'
+FINISHED = (SUCCEEDED, FAILED)
+
+QUEUE_DEPTH = Gauge('planetebi_job_queue_depth', 'Jobs waiting for a worker in this process.', ('kind',))
+JOBS_RUNNING = Gauge('planetebi_jobs_running', 'Jobs currently running in this process.', ('kind',))
+WAIT_SECONDS = Histogram('planetebi_job_wait_seconds', 'Time jobs spent queued before a worker took them.', ('kind',))
+RUN_SECONDS = Histogram('planetebi_job_run_seconds', 'Time jobs spent running.', ('kind', 'status'))
+REGISTRY.extend([QUEUE_DEPTH, JOBS_RUNNING, WAIT_SECONDS, RUN_SECONDS])
+
+
+class QueueFullError(Exception):
+    """Raised when a job is submitted while the queue already holds `max_queued` jobs."""
+
+
+class JobFailed(Exception):
+    """Raised by a job handler to fail a job with an HTTP status code and a message."""
+
+    def __init__(self, status_code, detail):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+def new_job(kind, payload):
+    """Create the record of a newly queued job."""
+    return {
+        'id': uuid.uuid4().hex, 'kind': kind, 'status': QUEUED, 'payload': payload,
+        'result': None, 'error': None, 'created_at': time.time(), 'started_at': None, 'finished_at': None
+    }
+
+
+class InMemoryJobStore:
+    """
+    Job records kept in the current process. Finished jobs are dropped `ttl` seconds after
+    they finish; queued and running jobs are lost on restart.
+    """
+
+    def __init__(self, ttl=JOB_TTL):
+        self.ttl = ttl
+        self._jobs = OrderedDict()  # job_id -> job, in submission order
+        self._lock = threading.Lock()
+
+    def add(self, job):
+        with self._lock:
+            self._expire(time.time())
+            self._jobs[job['id']] = dict(job)
+
+    def get(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def claim(self, job_id):
+        """Mark a queued job as running; returns the job, or None if it is not queued anymore."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None or job['status'] != QUEUED:
+                return None
+            job.update(status=RUNNING, started_at=time.time())
+            return dict(job)
+
+    def finish(self, job_id, status, result=None, error=None):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(status=status, result=result, error=error, finished_at=time.time())
+
+    def recover(self, timeout):
+        """Return the ids of queued jobs to schedule at startup; nothing survives a restart here."""
+        return []
+
+    def _expire(self, now):
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job['status'] in FINISHED and now - job['finished_at'] > self.ttl]:
+            del self._jobs[job_id]
+
+
+class SQLiteJobStore:
+    """
+    Job records in a shared SQLite file, so jobs survive restarts and every uvicorn worker can
+    answer polls for them. Claiming is a conditional update, so a job runs in one worker only.
+    """
+
+    def __init__(self, path=JOB_DB_PATH, ttl=JOB_TTL):
+        self.path = path
+        self.ttl = ttl
+        create_schema(
+            self.path,
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, kind TEXT NOT NULL, status TEXT NOT NULL, payload TEXT NOT NULL, "
+            "result TEXT, error TEXT, created_at REAL NOT NULL, started_at REAL, finished_at REAL)",
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+        )
+
+    @staticmethod
+    def _decode(row):
+        job = dict(row)
+        for field in ('payload', 'result', 'error'):
+            job[field] = json.loads(job[field]) if job[field] is not None else None
+        return job
+
+    def add(self, job):
+        with connect(self.path) as conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND finished_at < ?", FINISHED + (time.time() - self.ttl,)
+            )
+            conn.execute(
+                "INSERT INTO jobs (id, kind, status, payload, created_at) VALUES (?, ?, ?, ?, ?)",
+                (job['id'], job['kind'], job['status'], json.dumps(job['payload']), job['created_at'])
+            )
+
+    def get(self, job_id):
+        with connect(self.path) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._decode(row) if row else None
+
+    def claim(self, job_id):
+        """Mark a queued job as running; returns the job, or None if another worker took it."""
+        with connect(self.path) as conn:
+            claimed = conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ? WHERE id = ? AND status = ?",
+                (RUNNING, time.time(), job_id, QUEUED)
+            ).rowcount
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone() if claimed else None
+        return self._decode(row) if row else None
+
+    def finish(self, job_id, status, result=None, error=None):
+        with connect(self.path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE id = ?",
+                (status, json.dumps(result), json.dumps(error), time.time(), job_id)
+            )
+
+    def recover(self, timeout):
+        """
+        Requeue jobs whose worker died mid-run (running for longer than `timeout`) and return
+        the ids of every queued job, oldest first.
+        """
+        with connect(self.path) as conn:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL WHERE status = ? AND started_at < ?",
+                (QUEUED, RUNNING, time.time() - timeout)
+            )
+            rows = conn.execute("SELECT id FROM jobs WHERE status = ? ORDER BY created_at", (QUEUED,)).fetchall()
+        return [row['id'] for row in rows]
+
+
+def get_job_store(backend=JOB_BACKEND):
+    """Create the job store selected by the JOB_BACKEND setting."""
+    if backend == 'memory':
+        return InMemoryJobStore()
+    if backend == 'sqlite':
+        return SQLiteJobStore()
+    raise ValueError(f"Unknown job backend: {backend}")
+
+
+class JobQueue:
+    """
+    Runs long jobs in the background so HTTP handlers can return a job id immediately.
+    `handlers` maps a job kind to an async function taking the job payload and returning a
+    JSON-serializable result. At most `workers` jobs run at once and at most `max_queued`
+    wait; the store keeps the records that clients poll.
+    """
+
+    def __init__(self, store, handlers, workers=JOB_WORKERS, max_queued=JOB_QUEUE_SIZE, timeout=JOB_TIMEOUT):
+        self.store = store
+        self.handlers = handlers
+        self.workers = workers
+        self.max_queued = max_queued
+        self.timeout = timeout
+        self._queue = None
+        self._tasks = []
+        self._changed = {}  # job_id -> [asyncio.Event set when the job changes state, waiter count]
+
+    async def start(self):
+        """Start the workers and schedule jobs left queued by a previous run."""
+        self._queue = asyncio.Queue()
+        for job_id in await asyncio.to_thread(self.store.recover, self.timeout):
+            job = await asyncio.to_thread(self.store.get, job_id)
+            self._enqueue(job)
+        self._tasks = [asyncio.create_task(self._work()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Stop the workers. Jobs they were running stay marked running and are retried later."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def _enqueue(self, job):
+        QUEUE_DEPTH.inc(job['kind'])
+        self._queue.put_nowait((job['id'], job['kind']))
+
+    async def submit(self, kind, payload):
+        """Queue a job and return its record. Raises QueueFullError when the queue is full."""
+        if kind not in self.handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job queue has not been started")
+        if self._queue.qsize() >= self.max_queued:
+            raise QueueFullError("Too many queued jobs")
+        job = new_job(kind, payload)
+        await asyncio.to_thread(self.store.add, job)
+        self._enqueue(job)
+        return job
+
+    async def get(self, job_id):
+        """Return a job record, or None if it is unknown or expired."""
+        return await asyncio.to_thread(self.store.get, job_id)
+
+    async def wait(self, job_id, timeout):
+        """
+        Wait up to `timeout` seconds for a job to change state. Jobs run by another process are
+        not signalled here, so callers should re-read the job after every wait.
+        """
+        entry = self._changed.setdefault(job_id, [asyncio.Event(), 0])
+        entry[1] += 1
+        try:
+            await asyncio.wait_for(entry[0].wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0 and self._changed.get(job_id) is entry:
+                del self._changed[job_id]
+
+    def _notify(self, job_id):
+        entry = self._changed.pop(job_id, None)
+        if entry is not None:
+            entry[0].set()
+
+    async def _work(self):
+        while True:
+            job_id, kind = await self._queue.get()
+            QUEUE_DEPTH.dec(kind)
+            job = await asyncio.to_thread(self.store.claim, job_id)
+            if job is None:
+                continue  # Expired, or claimed by another process
+            WAIT_SECONDS.observe(job['started_at'] - job['created_at'], kind)
+            self._notify(job_id)
+            await self._run(job)
+            self._notify(job_id)
+
+    async def _run(self, job):
+        kind = job['kind']
+        JOBS_RUNNING.inc(kind)
+        start = time.perf_counter()
+        status, result, error = FAILED, None, None
+        try:
+            result = await asyncio.wait_for(self.handlers[kind](job['payload']), self.timeout)
+            status = SUCCEEDED
+        except JobFailed as e:
+            error = {'status_code': e.status_code, 'detail': e.detail}
+        except asyncio.TimeoutError:
+            error = {'status_code': 504, 'detail': f"Job did not finish within {self.timeout:g} seconds"}
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job['id'], kind)
+            error = {'status_code': 500, 'detail': str(e)}
+        finally:
+            JOBS_RUNNING.dec(kind)
+        RUN_SECONDS.observe(time.perf_counter() - start, kind, status)
+        await asyncio.to_thread(self.store.finish, job['id'], status, result, error)
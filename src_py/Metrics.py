@@ -0,0 +1,165 @@
+import time
+import inspect
+import functools
+import threading
+from bisect import bisect_left
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+# Histogram bucket upper bounds in seconds, from cache hits up to slow image generations
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Spans recorded while handling the current request, as (stage, seconds); None outside requests
+_request_spans = ContextVar('request_spans', default=None)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for _, value in pairs)
+    return '{' + ','.join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Histogram:
+    """Cumulative latency histogram per label combination, rendered in Prometheus text format."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._lock = threading.Lock()
+        self._series = {}  # label values -> [bucket counts..., +Inf count, sum]
+
+    def observe(self, value, *labels):
+        with self._lock:
+            series = self._series.setdefault(labels, [0] * (len(self.buckets) + 1) + [0.0])
+            series[bisect_left(self.buckets, value)] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            series = {labels: list(values) for labels, values in self._series.items()}
+        for labels, values in sorted(series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float('inf'),), values):
+                cumulative += count
+                label_text = _format_labels(self.labelnames, labels, [('le', _format_value(bound))])
+                lines.append(f'{self.name}_bucket{label_text} {cumulative}')
+            label_text = _format_labels(self.labelnames, labels)
+            lines.append(f'{self.name}_sum{label_text} {values[-1]!r}')
+            lines.append(f'{self.name}_count{label_text} {cumulative}')
+        return lines
+
+
+class Gauge:
+    """Current value per label combination, e.g. operations in flight."""
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help_text = help_text
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount=1):
+        self.inc(*labels, amount=-amount)
+
+    def set(self, value, *labels):
+        with self._lock:
+            self._values[labels] = value
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} gauge']
+        with self._lock:
+            values = dict(self._values)
+        for labels, value in sorted(values.items()):
+            lines.append(f'{self.name}{_format_labels(self.labelnames, labels)} {value}')
+        return lines
+
+
+class Counter(Gauge):
+    """Monotonically increasing count per label combination."""
+
+    def render(self):
+        lines = super().render()
+        lines[1] = f'# TYPE {self.name} counter'
+        return lines
+
+
+STAGE_SECONDS = Histogram('planetebi_stage_duration_seconds', 'Duration of instrumented stages.', ('stage',))
+STAGES_IN_FLIGHT = Gauge('planetebi_stages_in_flight', 'Instrumented stages currently running.', ('stage',))
+REQUEST_SECONDS = Histogram(
+    'planetebi_http_request_duration_seconds', 'Time to produce HTTP response headers.', ('method', 'route', 'status')
+)
+REQUESTS_IN_FLIGHT = Gauge('planetebi_http_requests_in_flight', 'HTTP requests currently being handled.')
+
+# Everything /metrics renders; other modules may register further metrics here
+REGISTRY = [STAGE_SECONDS, STAGES_IN_FLIGHT, REQUEST_SECONDS, REQUESTS_IN_FLIGHT]
+
+
+def render_metrics():
+    """Render every registered metric in the Prometheus text exposition format."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+
+@contextmanager
+def span(stage):
+    """
+    Time a stage: records it in the stage histogram, counts it as in flight while it runs and
+    adds it to the Server-Timing header of the request being handled, if any.
+    """
+    spans = _request_spans.get()
+    STAGES_IN_FLIGHT.inc(stage)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGES_IN_FLIGHT.dec(stage)
+        STAGE_SECONDS.observe(elapsed, stage)
+        if spans is not None:
+            spans.append((stage, elapsed))
+
+
+def timed(stage):
+    """Decorator that wraps every call of a sync or async function in span(stage)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def start_request_spans():
+    """Begin collecting spans for the current request; returns the list they are appended to."""
+    spans = []
+    _request_spans.set(spans)
+    return spans
+
+
+def server_timing(spans):
+    """Format collected spans as a Server-Timing header value (durations in milliseconds)."""
+    return ', '.join(f'{stage};dur={elapsed * 1000:.1f}' for stage, elapsed in spans)
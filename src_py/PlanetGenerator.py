@@ -0,0 +1,111 @@
+import numpy as np
+from src_py.DerivedPhysics import HostStars, stellar_luminosity, habitable_zone, surface_gravity, semi_major_axis, equilibrium_temperature
+
+# Host star used when no catalogue of real stars is supplied
+R_STAR = 1.0  # Assuming solar radii
+T_STAR = 5780  # Assuming solar temperature in Kelvin
+L_STAR = stellar_luminosity(R_STAR, T_STAR)
+HZ_INNER, HZ_OUTER = habitable_zone(L_STAR)  # AU
+SUN = HostStars(['Sun'], [T_STAR], [R_STAR], [1.0], [L_STAR], [HZ_INNER], [HZ_OUTER])
+
+# Approximate temperature based on user input
+TEMPERATURE_ESTIMATION = {
+    "cold": "< 250K",
+    "temperate": "250K - 350K",
+    "hot": "> 350K"
+}
+
+
+def estimate_planet_parameters_batch(features_list, index, n=1, rng=None, hosts=None):
+    """
+    Vectorized counterpart of PlanetAssistant.estimate_planet_parameters. Produces `n` candidate
+    planets for every feature dict in `features_list` in one NumPy pass and returns a dict of
+    arrays (one entry per candidate, grouped by feature set). `index` is a QuantileIndex and
+    `rng` a numpy Generator; pass a seeded one for reproducible catalogues. Each candidate orbits
+    a real star drawn from `hosts` (see CatalogStore.host_stars), or the Sun if none is given.
+    """
+    if rng is None:
+        rng = np.random.default_rng()
+
+    sizes = [features.get('planet_size', 'medium').lower() for features in features_list]
+
+    # Per-candidate sampling bounds, looked up once per feature set
+    bounds = [index.bounds(size) for size in sizes]
+    mass_low = np.repeat([b['pl_bmasse'][0] for b in bounds], n)
+    mass_high = np.repeat([b['pl_bmasse'][1] for b in bounds], n)
+    period_low = np.repeat([b['pl_orbper'][0] for b in bounds], n)
+    period_high = np.repeat([b['pl_orbper'][1] for b in bounds], n)
+
+    # Random selection within the quantile ranges for mass and orbital period
+    planet_mass_earth_masses = rng.uniform(mass_low, mass_high)
+    orbital_period_days = rng.uniform(period_low, period_high)
+
+    # Calculate gravity, scaling the radius with mass
+    gravity_normalized = surface_gravity(planet_mass_earth_masses, planet_mass_earth_masses ** (1 / 3))
+
+    # Draw a host star per candidate; its precomputed luminosity gives the habitable zone
+    hosts = hosts if hosts is not None and len(hosts) else SUN
+    host = hosts.sample(len(planet_mass_earth_masses), rng)
+
+    # Orbital period and distance calculations
+    orbital_period_years = orbital_period_days / 365.25
+    orbital_distance_au = semi_major_axis(orbital_period_days, hosts.mass[host])
+    habitable = (hosts.hz_inner[host] <= orbital_distance_au) & (orbital_distance_au <= hosts.hz_outer[host])
+
+    return {
+        'planet_size': np.repeat(sizes, n),
+        'planet_type': np.repeat([features.get('type', 'unknown') for features in features_list], n),
+        'planet_color': np.repeat([features.get('color', 'unknown') for features in features_list], n),
+        'approximate_temperature': np.repeat(
+            [TEMPERATURE_ESTIMATION.get(features.get('temperature', 'temperate'), 'unknown') for features in features_list],
+            n
+        ),
+        'approximate_mass_earth_masses': planet_mass_earth_masses,
+        'gravity_earth_g': gravity_normalized,
+        'orbital_period_years': orbital_period_years,
+        'orbital_distance_au': orbital_distance_au,
+        'habitable': habitable,
+        'host_star': hosts.names[host],
+        'star_temperature': hosts.temperature[host],
+        'star_luminosity': hosts.luminosity[host],
+        'equilibrium_temperature': equilibrium_temperature(
+            hosts.temperature[host], hosts.radius[host], orbital_distance_au
+        )
+    }
+
+
+def map_features_to_text_batch(planets):
+    """
+    Vectorized counterpart of PlanetAssistant.map_features_to_text over the arrays returned by
+    estimate_planet_parameters_batch.
+    """
+    mass = np.asarray(planets['approximate_mass_earth_masses'])
+    gravity = np.asarray(planets['gravity_earth_g'])
+    orbital_period = np.asarray(planets['orbital_period_years'])
+    distance = np.asarray(planets['orbital_distance_au'])
+    habitable = np.asarray(planets['habitable'], dtype=bool)
+
+    return {
+        "mass": np.select(
+            [mass < 1, mass <= 5],
+            ["smaller than Earth", "similar in mass to Earth"],
+            "much larger than Earth"
+        ),
+        "gravity": np.select(
+            [gravity < 1, gravity <= 1.5],
+            ["weaker gravity than Earth", "similar to Earth's gravity"],
+            "stronger gravity than Earth"
+        ),
+        "orbital_period": np.select(
+            [orbital_period < 1, orbital_period <= 5],
+            ["a quick orbit around its star", "a moderate orbit around its star"],
+            "a long orbit around its star"
+        ),
+        "temperature": np.asarray(planets.get('approximate_temperature', np.full(mass.shape, 'temperate climate'))),
+        "distance": np.select(
+            [distance < 1, distance <= 2],
+            ["very close to its star", "moderately distant from its star"],
+            "far from its star"
+        ),
+        "habitability": np.where(habitable, "located in the habitable zone", "outside the habitable zone")
+    }
@@ -0,0 +1,73 @@
+import os
+import threading
+import numpy as np
+from src_py.ColumnarFile import ColumnTable, encode_strings, source_stamp, load_or_build_table
+
+# Quantile ranges used to bucket planets by size
+SIZE_QUANTILES = {
+    'small': (0.0, 0.25),
+    'medium': (0.25, 0.75),
+    'large': (0.75, 1.0)
+}
+
+
+def build_csv_table(path):
+    """
+    Parse a CSV dataset into a ColumnTable: numeric columns as float64, everything else as
+    dictionary-encoded strings.
+    """
+    import pandas as pd  # Only needed when building the binary table
+
+    data = pd.read_csv(path)
+    numeric = {}
+    strings = {}
+    for column in data.columns:
+        if pd.api.types.is_numeric_dtype(data[column]):
+            numeric[column] = data[column].to_numpy(dtype=np.float64)
+        else:
+            strings[column] = encode_strings(data[column].fillna('').astype(str).tolist())
+    return ColumnTable(numeric, strings, source_stamp(path))
+
+
+class QuantileIndex:
+    """
+    Precomputed size-bucket bounds for the dataset columns used by
+    PlanetAssistant.estimate_planet_parameters. The index is built once from the data file and
+    rebuilt only when the file's modification time changes, so requests never touch pandas.
+    The columns are read from the file's binary table (see build_dataset), built on first use.
+    """
+
+    def __init__(self, path, columns=('pl_bmasse', 'pl_orbper')):
+        self.path = path
+        self.columns = columns
+        self._lock = threading.Lock()
+        self._state = None  # (mtime, bucket bounds), swapped atomically on rebuild
+        self.refresh()
+
+    def _build(self, mtime):
+        """Load the columns from the memory-mapped binary table and compute the bucket bounds."""
+        table = load_or_build_table(self.path, build_csv_table)
+        bounds = {}
+        for column in self.columns:
+            values = np.asarray(table.numeric[column])
+            values = values[~np.isnan(values)]
+            # Same linear interpolation as pandas' Series.quantile
+            bounds[column] = {
+                size: tuple(float(b) for b in np.quantile(values, quantile_range))
+                for size, quantile_range in SIZE_QUANTILES.items()
+            }
+        return mtime, bounds
+
+    def refresh(self):
+        """Rebuild the index if the data file changed since it was last built."""
+        mtime = os.stat(self.path).st_mtime
+        if self._state is not None and self._state[0] == mtime:
+            return
+        with self._lock:
+            if self._state is None or self._state[0] != mtime:
+                self._state = self._build(mtime)
+
+    def bounds(self, size):
+        """Return the (low, high) bounds of every indexed column for a size bucket."""
+        self.refresh()
+        return {column: column_bounds[size] for column, column_bounds in self._state[1].items()}
@@ -0,0 +1,55 @@
+import os
+import time
+import hashlib
+from src_py.SharedFiles import write_atomic, remove_file
+
+# Preview settings, overridable from the environment
+PREVIEW_DIR = os.getenv('PREVIEW_DIR', 'cache/previews')
+PREVIEW_TTL = float(os.getenv('PREVIEW_TTL', os.getenv('SESSION_TTL', '3600')))  # Seconds a preview is kept
+
+
+class PreviewStore:
+    """
+    Latest preview image of each conversation, kept on disk so follow-up edits can start from
+    it and every uvicorn worker on the host sees it. Files are named by a hash of the session
+    ID and removed `ttl` seconds after they were last written.
+    """
+
+    def __init__(self, directory=PREVIEW_DIR, ttl=PREVIEW_TTL):
+        self.directory = directory
+        self.ttl = ttl
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _path(self, session_id):
+        # Hashed so client-supplied session IDs can never name a path outside the directory
+        return os.path.join(self.directory, hashlib.sha256(session_id.encode('utf-8')).hexdigest())
+
+    def get(self, session_id):
+        """Return the preview bytes of a session, or None if it has none or it expired."""
+        path = self._path(session_id)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                return None
+            with open(path, 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, session_id, content):
+        """Replace the preview of a session and drop expired previews."""
+        write_atomic(self._path(session_id), content)
+        self._expire(time.time())
+
+    def discard(self, session_id):
+        """Drop the preview of a session, e.g. once it no longer shows the conversation."""
+        remove_file(self._path(session_id))
+
+    def _expire(self, now):
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                expired = now - os.path.getmtime(path) > self.ttl
+            except FileNotFoundError:
+                continue
+            if expired:
+                remove_file(path)
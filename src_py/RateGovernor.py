@@ -0,0 +1,281 @@
+import os
+import math
+import time
+import random
+import asyncio
+import threading
+from email.utils import parsedate_to_datetime
+from src_py.Metrics import Counter, Gauge, Histogram, REGISTRY
+
+# OpenAI quota and retry settings, overridable from the environment
+OPENAI_RPM = float(os.getenv('OPENAI_RPM', '500'))  # Chat and assistant requests per minute
+OPENAI_TPM = float(os.getenv('OPENAI_TPM', '200000'))  # Chat tokens per minute
+OPENAI_IMAGES_PER_MINUTE = float(os.getenv('OPENAI_IMAGES_PER_MINUTE', '50'))
+BURST_SECONDS = float(os.getenv('RATE_BURST_SECONDS', '10'))  # Quota that may be spent at once, in seconds' worth
+RETRY_MAX_ATTEMPTS = int(os.getenv('RETRY_MAX_ATTEMPTS', '5'))
+RETRY_BASE_DELAY = float(os.getenv('RETRY_BASE_DELAY', '1'))  # Seconds; doubles with every attempt
+RETRY_MAX_DELAY = float(os.getenv('RETRY_MAX_DELAY', '60'))
+BREAKER_FAILURES = int(os.getenv('BREAKER_FAILURES', '5'))  # Consecutive upstream failures that open the breaker
+BREAKER_RESET_TIMEOUT = float(os.getenv('BREAKER_RESET_TIMEOUT', '30'))  # Seconds before a trial call is let through
+
+# Statuses worth retrying; 429 additionally pauses every caller for the Retry-After period
+RETRY_STATUSES = (408, 409, 429, 500, 502, 503, 504)
+
+RETRIES = Counter('planetebi_upstream_retries_total', 'Upstream calls retried, by governor and status.', ('governor', 'status'))
+THROTTLE_SECONDS = Histogram('planetebi_upstream_throttle_seconds', 'Time calls waited for rate limit quota.', ('governor',))
+BREAKER_OPEN = Gauge('planetebi_upstream_breaker_open', '1 while the governor\'s circuit breaker is open.', ('governor',))
+REGISTRY.extend([RETRIES, THROTTLE_SECONDS, BREAKER_OPEN])
+
+
+class UpstreamError(Exception):
+    """An upstream API call failed with an HTTP status; `retry_after` is in seconds if known."""
+
+    def __init__(self, status_code, detail, retry_after=None):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+        self.retry_after = retry_after
+
+    @property
+    def client_status(self):
+        """Status to answer our own clients with: 429 when rate limited, 503 when upstream is down."""
+        if self.status_code == 429:
+            return 429
+        return 503 if self.status_code >= 500 else 502
+
+    @property
+    def headers(self):
+        """Retry-After header to pass on to our own clients, if upstream gave one."""
+        if self.retry_after is None:
+            return None
+        return {"Retry-After": str(max(1, math.ceil(self.retry_after)))}
+
+
+class CircuitOpenError(UpstreamError):
+    """Raised without calling upstream while the circuit breaker is open."""
+
+    def __init__(self, retry_after):
+        super().__init__(503, "Upstream API is unavailable, try again later", retry_after)
+
+
+def parse_retry_after(headers):
+    """Seconds to wait from a Retry-After (or retry-after-ms) header, or None."""
+    if headers is None:
+        return None
+    if headers.get('retry-after-ms'):
+        try:
+            return float(headers['retry-after-ms']) / 1000
+        except ValueError:
+            pass
+    value = headers.get('retry-after')
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `per_minute` tokens a minute, holding at most `capacity`.
+    Callers reserve tokens and are told how long to wait before using them, so sync and async
+    callers share one bucket and are served in arrival order. The level may go negative,
+    which queues later callers behind earlier reservations.
+    """
+
+    def __init__(self, per_minute, capacity=None):
+        self.rate = per_minute / 60
+        self.capacity = capacity or max(self.rate * BURST_SECONDS, 1.0)
+        self.level = self.capacity
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Take `amount` tokens and return the seconds to wait before they may be spent."""
+        amount = min(amount, self.capacity)  # Oversized requests only need a full bucket
+        with self._lock:
+            now = time.monotonic()
+            self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+            self.updated = now
+            self.level -= amount
+            delay = -self.level / self.rate if self.level < 0 else 0.0
+            return max(delay, self.blocked_until - now)
+
+    def refund(self, amount):
+        """Return tokens that were reserved but not used (negative amounts take more)."""
+        with self._lock:
+            self.level = min(self.capacity, self.level + amount)
+
+    def pause(self, seconds):
+        """Hold every caller back for `seconds`, e.g. after a 429 with Retry-After."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failures` consecutive upstream failures and rejects calls for `reset_timeout`
+    seconds; then lets a single trial call through, closing again if it succeeds.
+    """
+
+    def __init__(self, name, failures=BREAKER_FAILURES, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failures = failures
+        self.reset_timeout = reset_timeout
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self.trial_started = None  # A trial that never reports back is replaced after reset_timeout
+        self._lock = threading.Lock()
+
+    def check(self):
+        """Raise CircuitOpenError unless a call may go upstream now."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            remaining = self.opened_at + self.reset_timeout - now
+            if self.trial_started is not None and now - self.trial_started < self.reset_timeout:
+                remaining = self.trial_started + self.reset_timeout - now
+            if remaining > 0:
+                raise CircuitOpenError(remaining)
+            self.trial_started = now
+
+    def record_success(self):
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_started = None
+        BREAKER_OPEN.set(0, self.name)
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self.trial_started = None
+            if self.opened_at is None and self.consecutive_failures < self.failures:
+                return
+            self.opened_at = time.monotonic()
+        BREAKER_OPEN.set(1, self.name)
+
+
+class RateGovernor:
+    """
+    Client-side limiter for one upstream quota. Every call reserves one request and its
+    estimated tokens from the buckets, so retries stay inside the quota too. Retryable
+    failures (see RETRY_STATUSES) are retried with jittered exponential backoff, or after the
+    Retry-After period when upstream gives one; a 429 also pauses every other caller for that
+    long. Server errors feed a circuit breaker that fails fast while upstream is down.
+    """
+
+    def __init__(self, name, requests_per_minute, tokens_per_minute=None,
+                 max_attempts=RETRY_MAX_ATTEMPTS, base_delay=RETRY_BASE_DELAY, max_delay=RETRY_MAX_DELAY):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.breaker = CircuitBreaker(name)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def _reserve(self, tokens):
+        delay = self.requests.reserve(1)
+        if self.tokens is not None:
+            delay = max(delay, self.tokens.reserve(tokens))
+        THROTTLE_SECONDS.observe(delay, self.name)
+        return delay
+
+    def settle(self, estimated, actual):
+        """Give back (or take) the difference between a call's estimated and actual token cost."""
+        if self.tokens is not None and actual is not None:
+            self.tokens.refund(estimated - actual)
+
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before retrying `error`, or None if it should be raised."""
+        if error.status_code not in RETRY_STATUSES or attempt + 1 >= self.max_attempts:
+            return None
+        RETRIES.inc(self.name, error.status_code)
+        if error.status_code == 429:
+            delay = error.retry_after if error.retry_after is not None else self._backoff(attempt)
+            self.requests.pause(delay)
+            return delay + random.uniform(0, self.base_delay)
+        return error.retry_after if error.retry_after is not None else self._backoff(attempt)
+
+    def _backoff(self, attempt):
+        # Full jitter keeps concurrent callers from retrying in lockstep
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def _record(self, error):
+        # Anything but a server error shows upstream is up, even a 429
+        if error.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+
+    async def call(self, send, tokens=1, usage=None):
+        """
+        Await `send()` within the quota and return its result. `send` must raise UpstreamError
+        for failed responses. `tokens` is the estimated token cost; `usage(result)` may return
+        the actual cost so the difference is given back.
+        """
+        for attempt in range(self.max_attempts):
+            self.breaker.check()
+            delay = self._reserve(tokens)
+            if delay:
+                await asyncio.sleep(delay)
+            try:
+                result = await send()
+            except UpstreamError as e:
+                self._record(e)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                await asyncio.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.settle(tokens, usage(result) if usage else None)
+            return result
+
+    def call_sync(self, send, tokens=1, usage=None):
+        """Blocking variant of call for synchronous callers."""
+        for attempt in range(self.max_attempts):
+            self.breaker.check()
+            delay = self._reserve(tokens)
+            if delay:
+                time.sleep(delay)
+            try:
+                result = send()
+            except UpstreamError as e:
+                self._record(e)
+                delay = self._retry_delay(e, attempt)
+                if delay is None:
+                    raise
+                time.sleep(delay)
+                continue
+            self.breaker.record_success()
+            self.settle(tokens, usage(result) if usage else None)
+            return result
+
+
+def estimate_tokens(text, completion_tokens=256):
+    """Rough token cost of a request: about four characters per prompt token plus the reply."""
+    return len(text) // 4 + completion_tokens
+
+
+# Shared by PlanetAssistant and Chatbot, which use the same chat model quota
+chat_governor = RateGovernor('openai_chat', OPENAI_RPM, OPENAI_TPM)
+image_governor = RateGovernor('openai_images', OPENAI_IMAGES_PER_MINUTE)
+
+
+def raise_for_upstream_status(response):
+    """Raise UpstreamError for a non-2xx requests or httpx response from the OpenAI API."""
+    if 200 <= response.status_code < 300:
+        return
+    try:
+        detail = response.json()['error']['message']
+    except (ValueError, KeyError, TypeError):
+        detail = response.text
+    raise UpstreamError(response.status_code, detail, parse_retry_after(response.headers))
@@ -0,0 +1,84 @@
+from bisect import bisect_left
+import numpy as np
+
+# Fuzzy matches need at least this trigram similarity to be returned
+MIN_FUZZY_SCORE = 0.2
+
+
+def trigrams(text):
+    """Return the set of character trigrams of a lowercased, space-padded string."""
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class SearchIndex:
+    """
+    Autocomplete index over star and planet names: a sorted key array answers prefix queries
+    with a binary search, and a trigram inverted index ranks fuzzy matches by similarity.
+    """
+
+    def __init__(self, catalog):
+        entries = {}
+        star_codes, star_values = catalog.strings['star_name']
+        planet_codes, planet_values = catalog.strings['planet_name']
+        for star_name in catalog.systems:
+            entries[(star_name, 'star')] = star_name
+        for planet_code, star_code in zip(planet_codes.tolist(), star_codes.tolist()):
+            entries[(planet_values[planet_code], 'planet')] = star_values[star_code]
+
+        # Sorted by lowercased name for prefix search
+        self.entries = sorted(
+            ({'name': name, 'type': kind, 'star_name': star_name} for (name, kind), star_name in entries.items()),
+            key=lambda entry: (entry['name'].lower(), entry['type'])
+        )
+        self.keys = [entry['name'].lower() for entry in self.entries]
+
+        # trigram -> array of entry ids, plus each entry's trigram count for scoring
+        postings = {}
+        self.trigram_counts = np.empty(len(self.keys), dtype=np.int32)
+        for entry_id, key in enumerate(self.keys):
+            key_trigrams = trigrams(key)
+            self.trigram_counts[entry_id] = len(key_trigrams)
+            for trigram in key_trigrams:
+                postings.setdefault(trigram, []).append(entry_id)
+        self.postings = {trigram: np.array(ids, dtype=np.int32) for trigram, ids in postings.items()}
+
+    def prefix(self, query, limit=10):
+        """Return the ids of entries whose name starts with the query, in alphabetical order."""
+        query = query.lower()
+        start = bisect_left(self.keys, query)
+        ids = []
+        for entry_id in range(start, min(start + limit, len(self.keys))):
+            if not self.keys[entry_id].startswith(query):
+                break
+            ids.append(entry_id)
+        return ids
+
+    def fuzzy(self, query, limit=10):
+        """Return the ids of the entries most similar to the query by trigram Jaccard score."""
+        query_trigrams = [trigram for trigram in trigrams(query.lower()) if trigram in self.postings]
+        if not query_trigrams:
+            return []
+        hits = np.bincount(
+            np.concatenate([self.postings[trigram] for trigram in query_trigrams]),
+            minlength=len(self.keys)
+        )
+        candidates = np.flatnonzero(hits)
+        scores = hits[candidates] / (len(trigrams(query.lower())) + self.trigram_counts[candidates] - hits[candidates])
+        keep = scores >= MIN_FUZZY_SCORE
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        return candidates[np.argsort(-scores, kind='stable')].tolist()
+
+    def search(self, query, limit=10):
+        """Prefix matches first, then fuzzy matches to fill the remaining slots."""
+        query = query.strip()
+        if not query:
+            return []
+        ids = self.prefix(query, limit)
+        if len(ids) < limit:
+            seen = set(ids)
+            ids += [entry_id for entry_id in self.fuzzy(query, limit) if entry_id not in seen][:limit - len(ids)]
+        return [self.entries[entry_id] for entry_id in ids]
@@ -0,0 +1,9 @@
+import json
+
+
+def sse_event(data, event=None):
+    """
+    Format one Server-Sent Events message with a JSON payload.
+    """
+    message = f"event: {event}\n" if event else ""
+    return message + f"data: {json.dumps(data)}\n\n"
@@ -0,0 +1,124 @@
+import os
+import json
+import time
+import uuid
+import threading
+from collections import OrderedDict
+from src_py.SqliteDb import connect, create_schema
+
+# Session settings, overridable from the environment
+SESSION_BACKEND = os.getenv('SESSION_BACKEND', 'memory')  # 'memory' or 'sqlite'
+SESSION_DB_PATH = os.getenv('SESSION_DB_PATH', 'sessions.sqlite3')
+SESSION_TTL = float(os.getenv('SESSION_TTL', '3600'))  # Seconds of inactivity before a session expires
+SESSION_MAX = int(os.getenv('SESSION_MAX', '10000'))  # Least recently used sessions are dropped beyond this
+
+
+def new_session_id():
+    """Generate a new random session ID."""
+    return uuid.uuid4().hex
+
+
+class InMemorySessionStore:
+    """
+    Session-keyed store for PlanetAssistant.conversation_state that lives in the current process.
+    Entries expire after `ttl` seconds without access and the least recently used ones are
+    evicted once more than `max_sessions` are stored.
+    """
+
+    def __init__(self, ttl=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # session_id -> (last_access, serialized state)
+        self._lock = threading.Lock()
+
+    def get(self, session_id):
+        """Return the stored state for a session, or None if it is unknown or expired."""
+        now = time.time()
+        with self._lock:
+            entry = self._sessions.get(session_id)
+            if entry is None:
+                return None
+            if now - entry[0] > self.ttl:
+                del self._sessions[session_id]
+                return None
+            self._sessions[session_id] = (now, entry[1])
+            self._sessions.move_to_end(session_id)
+        # States are stored serialized so callers never share mutable dicts
+        return json.loads(entry[1])
+
+    def set(self, session_id, state):
+        """Store the state for a session, evicting expired and least recently used sessions."""
+        now = time.time()
+        with self._lock:
+            self._sessions[session_id] = (now, json.dumps(state))
+            self._sessions.move_to_end(session_id)
+            while self._sessions:
+                oldest_id, (last_access, _) = next(iter(self._sessions.items()))
+                if now - last_access <= self.ttl and len(self._sessions) <= self.max_sessions:
+                    break
+                del self._sessions[oldest_id]
+
+    def delete(self, session_id):
+        """Remove a session if it exists."""
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+
+class SQLiteSessionStore:
+    """
+    Session store backed by a shared SQLite file, so every uvicorn worker sees the same
+    conversations. Uses the same TTL and LRU rules as InMemorySessionStore.
+    """
+
+    def __init__(self, path=SESSION_DB_PATH, ttl=SESSION_TTL, max_sessions=SESSION_MAX):
+        self.path = path
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        create_schema(
+            self.path,
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "session_id TEXT PRIMARY KEY, state TEXT NOT NULL, last_access REAL NOT NULL)",
+            "CREATE INDEX IF NOT EXISTS sessions_last_access ON sessions (last_access)"
+        )
+
+    def get(self, session_id):
+        """Return the stored state for a session, or None if it is unknown or expired."""
+        now = time.time()
+        with connect(self.path) as conn:
+            row = conn.execute(
+                "SELECT state FROM sessions WHERE session_id = ? AND last_access >= ?",
+                (session_id, now - self.ttl)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE sessions SET last_access = ? WHERE session_id = ?", (now, session_id))
+        return json.loads(row[0])
+
+    def set(self, session_id, state):
+        """Store the state for a session, evicting expired and least recently used sessions."""
+        now = time.time()
+        with connect(self.path) as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, last_access) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), now)
+            )
+            conn.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl,))
+            conn.execute(
+                "DELETE FROM sessions WHERE session_id IN ("
+                "SELECT session_id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+                (self.max_sessions,)
+            )
+
+    def delete(self, session_id):
+        """Remove a session if it exists."""
+        with connect(self.path) as conn:
+            conn.execute("DELETE FROM sessions WHERE session_id = ?", (session_id,))
+
+
+def get_session_store(backend=SESSION_BACKEND):
+    """Create the session store selected by the SESSION_BACKEND setting."""
+    if backend == 'memory':
+        return InMemorySessionStore()
+    if backend == 'sqlite':
+        return SQLiteSessionStore()
+    raise ValueError(f"Unknown session backend: {backend}")
@@ -0,0 +1,65 @@
+import os
+import threading
+from contextlib import contextmanager
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+@contextmanager
+def atomic_write(path, mode='wb'):
+    """
+    Open a temporary file next to `path` and move it over `path` once the block completes, so
+    other threads and worker processes never read a partial file.
+    """
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, mode) as f:
+            yield f
+        os.replace(tmp_path, path)
+    except BaseException:
+        remove_file(tmp_path)
+        raise
+
+
+def write_atomic(path, data, mode='wb'):
+    """Replace the contents of `path` with `data` through atomic_write."""
+    with atomic_write(path, mode) as f:
+        f.write(data)
+
+
+def remove_file(path):
+    """Delete a file, ignoring it if it is already gone."""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def file_lock(path):
+    """
+    Hold an exclusive lock on `path`, created if missing, for the duration of the block. Other
+    threads and worker processes locking the same path wait until it is released.
+    """
+    with open(path, 'a+b') as f:
+        if fcntl:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass  # LK_LOCK gives up after about ten seconds; keep waiting
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
@@ -0,0 +1,79 @@
+import numpy as np
+from src_py.PlanetGenerator import T_STAR
+
+# Physical features compared between planets; heavy-tailed ones are compared on a log scale
+FEATURES = ('planet_mass', 'planet_radius', 'orbital_period', 'orbital_eccentricity', 'star_temperature')
+LOG_FEATURES = ('planet_mass', 'planet_radius', 'orbital_period')
+
+
+def generated_planet_features(planet):
+    """
+    Map a planet produced by estimate_planet_parameters onto the catalogue features, using the
+    same assumptions as the generator (radius scaling with mass, circular orbit). Planets from
+    before host stars were sampled orbit a Sun-like star.
+    """
+    mass = planet['approximate_mass_earth_masses']
+    return {
+        'planet_mass': mass,
+        'planet_radius': mass ** (1 / 3),
+        'orbital_period': planet['orbital_period_years'] * 365.25,
+        'orbital_eccentricity': 0.0,
+        'star_temperature': planet.get('star_temperature', T_STAR)
+    }
+
+
+class SimilarityIndex:
+    """
+    KD-tree over the normalized physical features of every catalogue planet. Features are
+    log-scaled where heavy-tailed and z-scored, and missing values are filled with the column
+    median so every planet can be matched.
+    """
+
+    def __init__(self, catalog):
+        self.catalog = catalog
+        raw = np.column_stack([np.asarray(catalog.numeric[feature], dtype=np.float64) for feature in FEATURES])
+        scaled = self._scale(raw)
+        self.mean = np.nanmean(scaled, axis=0)
+        self.std = np.nanstd(scaled, axis=0)
+        self.std[self.std == 0] = 1.0
+        normalized = (scaled - self.mean) / self.std
+        # After z-scoring the median is the natural stand-in for a missing value
+        self.fill = np.nanmedian(normalized, axis=0)
+        normalized = np.where(np.isnan(normalized), self.fill, normalized)
+        from scipy.spatial import cKDTree  # Slow to import, and only needed once the index is built
+        self.tree = cKDTree(normalized)
+
+    @staticmethod
+    def _scale(raw):
+        scaled = raw.copy()
+        for i, feature in enumerate(FEATURES):
+            if feature in LOG_FEATURES:
+                with np.errstate(divide='ignore', invalid='ignore'):
+                    scaled[:, i] = np.log10(np.where(raw[:, i] > 0, raw[:, i], np.nan))
+        return scaled
+
+    def normalize(self, queries):
+        """Turn a list of feature dicts into normalized query vectors; missing features use the median."""
+        raw = np.array(
+            [[np.nan if query.get(feature) is None else float(query[feature]) for feature in FEATURES] for query in queries],
+            dtype=np.float64
+        ).reshape(len(queries), len(FEATURES))
+        normalized = (self._scale(raw) - self.mean) / self.std
+        return np.where(np.isnan(normalized), self.fill, normalized)
+
+    def query(self, queries, k=5):
+        """
+        Find the k closest catalogue planets for every feature dict in one vectorized tree query.
+        Returns one list of rows (with a `distance` field) per query.
+        """
+        k = min(k, len(self.catalog))
+        distances, indices = self.tree.query(self.normalize(queries), k=k)
+        distances = distances.reshape(len(queries), k)
+        indices = indices.reshape(len(queries), k)
+        results = []
+        for row_distances, row_indices in zip(distances, indices):
+            rows = self.catalog.rows(row_indices)
+            for row, distance in zip(rows, row_distances.tolist()):
+                row['distance'] = round(distance, 4)
+            results.append(rows)
+        return results
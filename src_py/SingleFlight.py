@@ -0,0 +1,56 @@
+import asyncio
+from src_py.Metrics import Counter, Gauge, REGISTRY
+
+CALLS = Counter(
+    'planetebi_singleflight_calls_total', 'Coalesced calls by group; followers shared a leader\'s result.',
+    ('group', 'role')
+)
+IN_FLIGHT = Gauge('planetebi_singleflight_in_flight', 'Distinct coalesced calls currently running.', ('group',))
+REGISTRY.extend([CALLS, IN_FLIGHT])
+
+
+class _Call:
+    def __init__(self, task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent identical async calls: while a call for a key is running, further
+    callers with the same key await the same task instead of starting their own, and all of
+    them receive its result or exception. A caller that is cancelled stops waiting without
+    cancelling the shared call; the call is cancelled only once every caller has gone.
+    Results are not kept after the call finishes.
+    """
+
+    def __init__(self, group):
+        self.group = group
+        self._calls = {}
+
+    def _forget(self, key, call):
+        if self._calls.get(key) is call:
+            del self._calls[key]
+            IN_FLIGHT.dec(self.group)
+
+    async def do(self, key, fn, *args, **kwargs):
+        """Return the result of `await fn(*args, **kwargs)`, shared with concurrent callers of `key`."""
+        call = self._calls.get(key)
+        if call is None:
+            call = _Call(asyncio.ensure_future(fn(*args, **kwargs)))
+            self._calls[key] = call
+            IN_FLIGHT.inc(self.group)
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+            CALLS.inc(self.group, 'leader')
+        else:
+            CALLS.inc(self.group, 'follower')
+
+        call.waiters += 1
+        try:
+            # Shielded so one caller's cancellation leaves the others' call running
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                call.task.cancel()
+                self._forget(key, call)
@@ -0,0 +1,28 @@
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(path):
+    """
+    Open a connection to the SQLite database at `path` that commits on success and is always
+    closed afterwards. Rows can be read by index or by column name.
+    """
+    conn = sqlite3.connect(path, timeout=30)
+    conn.row_factory = sqlite3.Row
+    try:
+        with conn:
+            yield conn
+    finally:
+        conn.close()
+
+
+def create_schema(path, *statements):
+    """
+    Switch the database at `path` to WAL, which lets readers in other workers proceed while one
+    worker writes, and run the given CREATE statements.
+    """
+    with connect(path) as conn:
+        conn.execute("PRAGMA journal_mode=WAL")
+        for statement in statements:
+            conn.execute(statement)
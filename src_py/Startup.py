@@ -0,0 +1,107 @@
+import os
+import time
+import asyncio
+import logging
+import threading
+from src_py.Metrics import Gauge, REGISTRY
+
+logger = logging.getLogger(__name__)
+
+# Seconds before a resource that failed to load is tried again, overridable from the environment
+STARTUP_RETRY_INTERVAL = float(os.getenv('STARTUP_RETRY_INTERVAL', '30'))
+
+READY = Gauge('planetebi_resource_ready', '1 once a lazily loaded resource is ready.', ('resource',))
+LOAD_SECONDS = Gauge('planetebi_resource_load_seconds', 'Time the last load of a resource took.', ('resource',))
+REGISTRY.extend([READY, LOAD_SECONDS])
+
+
+class ResourceUnavailable(Exception):
+    """Raised when a resource is needed but failed to load; it is retried after `retry_after` seconds."""
+
+    def __init__(self, name, error, retry_after):
+        super().__init__(f"{name} is unavailable: {error}")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class LazyResource:
+    """
+    A heavy object (dataset, index, remote client) built by `factory` on first use instead of
+    at import time, so workers boot quickly. The warm-up task of the app lifespan builds it in
+    the background; a request that needs it earlier builds it or waits for the build in
+    progress. A failed build is retried at most every `retry_interval` seconds. Resources
+    that are not `required` are reported by /readyz without holding readiness back.
+    """
+
+    def __init__(self, name, factory, required=True, retry_interval=STARTUP_RETRY_INTERVAL):
+        self.name = name
+        self.factory = factory
+        self.required = required
+        self.retry_interval = retry_interval
+        self._value = None
+        self._ready = False
+        self._error = None
+        self._failed_at = None
+        self._lock = threading.Lock()
+        READY.set(0, name)
+
+    @property
+    def ready(self):
+        return self._ready
+
+    def status(self):
+        """'ready', 'loading' or the error of the last failed build."""
+        if self._ready:
+            return 'ready'
+        return f"failed: {self._error}" if self._error else 'loading'
+
+    def get(self):
+        """Return the resource, building it first if needed. Blocks; see get_async."""
+        if self._ready:
+            return self._value
+        with self._lock:
+            if self._ready:
+                return self._value
+            if self._failed_at is not None:
+                wait = self._failed_at + self.retry_interval - time.monotonic()
+                if wait > 0:
+                    raise ResourceUnavailable(self.name, self._error, wait)
+            start = time.perf_counter()
+            try:
+                self._value = self.factory()
+            except Exception as e:
+                self._error, self._failed_at = str(e) or type(e).__name__, time.monotonic()
+                logger.exception("Loading %s failed", self.name)
+                raise ResourceUnavailable(self.name, self._error, self.retry_interval)
+            self._ready, self._error, self._failed_at = True, None, None
+            LOAD_SECONDS.set(time.perf_counter() - start, self.name)
+            READY.set(1, self.name)
+            return self._value
+
+    async def get_async(self):
+        """Non-blocking variant of get: a build runs in a worker thread."""
+        if self._ready:
+            return self._value
+        return await asyncio.to_thread(self.get)
+
+
+async def warm_up(resources, retry_interval=STARTUP_RETRY_INTERVAL):
+    """
+    Build every resource in order in the background, retrying the ones that failed until all
+    are ready. Meant to run as a task for the lifetime of the app.
+    """
+    while True:
+        for resource in resources:
+            try:
+                await resource.get_async()
+            except ResourceUnavailable:
+                pass  # Logged by get; reported by /readyz until a retry succeeds
+        if all(resource.ready for resource in resources):
+            return
+        await asyncio.sleep(retry_interval)
+
+
+def readiness(resources):
+    """Return whether every required resource is ready, and the status of each resource."""
+    ready = all(resource.ready for resource in resources if resource.required)
+    return ready, {resource.name: resource.status() for resource in resources}
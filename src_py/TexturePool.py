@@ -0,0 +1,178 @@
+import os
+import json
+import math
+import time
+import asyncio
+import logging
+import threading
+from itertools import combinations
+from src_py.Metrics import Counter, Gauge, REGISTRY
+from src_py.SharedFiles import write_atomic, remove_file
+
+logger = logging.getLogger(__name__)
+
+# Texture pool settings, overridable from the environment
+TEXTURE_POOL_DIR = os.getenv('TEXTURE_POOL_DIR', 'cache/texture_pool')
+TEXTURE_POOL_VARIANTS = int(os.getenv('TEXTURE_POOL_VARIANTS', '3'))  # Variants kept ready per combination
+TEXTURE_POOL_REFILLS = int(os.getenv('TEXTURE_POOL_REFILLS', '2'))  # Background generations running at once
+
+# Temperature bands the UI's Kelvin input is mapped to, as (upper bound in K, band name)
+TEMPERATURE_BANDS = ((200, 'frozen'), (270, 'cold'), (330, 'temperate'), (600, 'hot'), (float('inf'), 'scorching'))
+
+# The combination space pre-generated by prewarm_textures, in normalized form
+POOL_TEMPERATURES = tuple(name for _, name in TEMPERATURE_BANDS)
+POOL_TYPES = ('cloudy', 'gas', 'ice', 'rocky')  # The type checkboxes of the Galaxy-3js pages
+POOL_COLORS = ('red', 'orange', 'yellow', 'green', 'blue', 'purple', 'white', 'gray', 'brown', 'earthy')
+DEFAULT_TYPES = ['terrestrial']  # Used when no type box is checked
+
+LOOKUPS = Counter('planetebi_texture_pool_lookups_total', 'Texture pool lookups by result.', ('result',))
+REFILLING = Gauge('planetebi_texture_pool_refills_in_flight', 'Combinations being refilled in the background.')
+REGISTRY.extend([LOOKUPS, REFILLING])
+
+
+def temperature_band(value):
+    """Map a temperature in Kelvin to its band name, or return None if `value` is not a number."""
+    try:
+        kelvin = float(value)
+    except ValueError:
+        return None
+    if math.isnan(kelvin):
+        return None
+    return next(name for bound, name in TEMPERATURE_BANDS if kelvin < bound)
+
+
+def pool_combinations(temperatures=POOL_TEMPERATURES, colors=POOL_COLORS, types=POOL_TYPES):
+    """Yield every normalized feature combination of the pool, including the no-type default."""
+    type_sets = [sorted(subset) for size in range(1, len(types) + 1) for subset in combinations(types, size)]
+    for temperature in temperatures:
+        for type_set in [DEFAULT_TYPES] + type_sets:
+            for color in colors:
+                yield {'temperature': temperature, 'types': type_set, 'color': color}
+
+
+class TexturePool:
+    """
+    Pre-generated textures for the fixed feature space of the UI, so those requests never wait
+    for DALL-E. A manifest maps each combination's cache key to its features and up to
+    `variants` ready variants, whose processed images are kept next to it. Taking a variant
+    uses it up, except the last one, which keeps being served until a refill arrives, so a
+    pooled combination always answers instantly. The manifest is re-read only when another
+    process has changed it.
+    """
+
+    def __init__(self, directory=TEXTURE_POOL_DIR, variants=TEXTURE_POOL_VARIANTS, refills=TEXTURE_POOL_REFILLS):
+        self.directory = directory
+        self.variants = max(1, variants)
+        self.refills = max(1, refills)
+        self.manifest_path = os.path.join(directory, 'manifest.json')
+        self._lock = threading.Lock()
+        self._manifest = {}
+        self._mtime = None
+        self._refill_slots = None
+        self._refilling = {}  # key -> background refill task
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _load(self):
+        """Refresh the in-memory manifest if the file changed since it was last read."""
+        try:
+            mtime = os.stat(self.manifest_path).st_mtime_ns
+        except FileNotFoundError:
+            self._manifest, self._mtime = {}, None
+            return
+        if mtime == self._mtime:
+            return
+        try:
+            with open(self.manifest_path) as f:
+                self._manifest = json.load(f)
+        except (FileNotFoundError, ValueError):
+            self._manifest = {}
+        self._mtime = mtime
+
+    def _save(self):
+        """Write the manifest atomically and remember its modification time."""
+        write_atomic(self.manifest_path, json.dumps(self._manifest), mode='w')
+        self._mtime = os.stat(self.manifest_path).st_mtime_ns
+
+    def __contains__(self, key):
+        with self._lock:
+            self._load()
+            return key in self._manifest
+
+    def missing(self, key):
+        """Number of variants a combination is short of a full pool."""
+        with self._lock:
+            self._load()
+            entry = self._manifest.get(key)
+            return self.variants - len(entry['variants']) if entry else self.variants
+
+    def take(self, key):
+        """
+        Return a ready variant of a combination as a dict with `img_url` and `textures`, or None
+        if the combination is not pooled. The variant is removed unless it is the last one.
+        """
+        with self._lock:
+            self._load()
+            entry = self._manifest.get(key)
+            if not entry or not entry['variants']:
+                LOOKUPS.inc('miss')
+                return None
+            if len(entry['variants']) > 1:
+                variant = entry['variants'].pop(0)
+                self._save()
+                remove_file(os.path.join(self.directory, variant['file']))
+            else:
+                variant = entry['variants'][0]
+        LOOKUPS.inc('hit')
+        return {'img_url': variant['img_url'], 'textures': variant['textures']}
+
+    def add(self, key, features, img_url, content, textures):
+        """Store a newly generated variant of a combination, dropping the oldest beyond `variants`."""
+        now = time.time()
+        with self._lock:
+            self._load()
+            entry = self._manifest.setdefault(key, {'features': features, 'variants': []})
+            file_name = f"{key}-{int(now * 1000)}.img"
+            write_atomic(os.path.join(self.directory, file_name), content)
+            entry['variants'].append({'img_url': img_url, 'textures': textures, 'file': file_name, 'created': now})
+            for variant in entry['variants'][:-self.variants]:
+                remove_file(os.path.join(self.directory, variant['file']))
+            entry['variants'] = entry['variants'][-self.variants:]
+            self._save()
+
+    def refill_later(self, key, features, create):
+        """
+        Top a combination back up in the background. `create(features)` must return
+        (img_url, textures, content) for a new variant. Each combination is refilled by at most
+        one task, and at most `refills` generations run at once across combinations.
+        """
+        if key in self._refilling:
+            return
+        if self._refill_slots is None:
+            self._refill_slots = asyncio.Semaphore(self.refills)
+        task = asyncio.create_task(self._refill(key, features, create))
+        self._refilling[key] = task
+        REFILLING.inc()
+        task.add_done_callback(lambda _: self._refill_done(key))
+
+    def _refill_done(self, key):
+        self._refilling.pop(key, None)
+        REFILLING.dec()
+
+    async def _refill(self, key, features, create):
+        try:
+            while await asyncio.to_thread(self.missing, key) > 0:
+                async with self._refill_slots:
+                    img_url, textures, content = await create(features)
+                await asyncio.to_thread(self.add, key, features, img_url, content, textures)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # The variant still being served covers the combination until a later refill succeeds
+            logger.exception("Refilling texture pool entry %s failed", key)
+
+    async def stop(self):
+        """Cancel the background refills still running."""
+        tasks = list(self._refilling.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,92 @@
+import asyncio
+import logging
+from fastapi import HTTPException
+from starlette.concurrency import run_in_threadpool
+from src_py.GptApi import PlanetAssistant
+from src_py.TexturePool import temperature_band, DEFAULT_TYPES
+from src_py.Startup import LazyResource
+from src_py.Metrics import span
+
+logger = logging.getLogger(__name__)
+
+# Predefined prompt with placeholders for /generate_image/
+IMAGE_PROMPT_TEMPLATE = (
+    "The image presents a panoramic view of a [temperature] [type] planet, "
+    "highlighted in a palette of [color] tones. It captures the dynamic and complex "
+    "surface and atmospheric features, conveying a sense of depth and motion. "
+    "The planet is centrally positioned in the composition. don't generate any shadows in this picture."
+)
+
+
+def load_uploader():
+    """
+    Import and configure the Cloudinary uploader; the SDK is slow to import, so this happens
+    during warm-up rather than at startup.
+    """
+    import cloudinary
+    import cloudinary.uploader
+    cloudinary.config(
+      cloud_name = "api",
+      api_key = "api",
+      api_secret = "api",
+      secure = True
+    )
+    return cloudinary.uploader
+
+
+uploader = LazyResource('cloudinary', load_uploader, required=False)
+
+
+def normalize_features(features):
+    """
+    Normalize a FeaturesModel so equivalent requests share a cache entry. Temperatures given
+    in Kelvin are mapped to their band (see TexturePool.TEMPERATURE_BANDS).
+    """
+    temperature = features.temperature.strip().lower()
+    return {
+        'temperature': temperature_band(temperature) or temperature or 'temperate',
+        'types': sorted({t.strip().lower() for t in features.types if t.strip()}) or DEFAULT_TYPES,
+        'color': features.color.strip().lower() or 'earthy'
+    }
+
+
+def render_image_prompt(features):
+    """
+    Fill the image prompt template with normalized features.
+    """
+    prompt = IMAGE_PROMPT_TEMPLATE.replace('[temperature]', features['temperature'])
+    prompt = prompt.replace('[type]', ", ".join(features['types']))
+    prompt = prompt.replace('[color]', features['color'])
+    return prompt
+
+
+async def create_texture(normalized):
+    """
+    Generate, process and upload the texture for normalized features. Returns the URL of the
+    full-size texture, the URLs of every level by width and the processed image bytes.
+    Raises HTTPException if DALL-E or the download fail.
+    """
+    assistant = PlanetAssistant()
+    prompt = render_image_prompt(normalized)
+
+    # Generate the image URL
+    logger.debug("Generating image for prompt: %s", prompt)
+    image_url = await assistant.generate_dalle_image_async(prompt=prompt)
+    if not image_url:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+
+    # Crop the image and build the texture levels in memory
+    levels = await assistant.preprocess_dalle_image_levels_async(image_url)
+    if not levels:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+
+    # Upload every texture level concurrently, largest first
+    upload = (await uploader.get_async()).upload
+    with span('cloudinary_upload'):
+        uploads = await asyncio.gather(*(
+            run_in_threadpool(upload, file=content, unique_filename=True, overwrite=True)
+            for _, content in levels
+        ))
+    final_url = uploads[0]['secure_url']
+    textures = {str(width): upload['secure_url'] for (width, _), upload in zip(levels, uploads)}
+    return final_url, textures, levels[0][1]
@@ -1,35 +1,67 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+from contextlib import asynccontextmanager
+import gzip
+import json
+import hashlib
+import logging
+import math
+import time
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from src_py.GptApi import PlanetAssistant  # Import the PlanetAssistant class
-import pandas as pd
-import requests
-from io import BytesIO
-from starlette.responses import StreamingResponse
-import openai
-import os
+from starlette.concurrency import run_in_threadpool
+from src_py.GptApi import PlanetAssistant, PREVIEW_IMAGE_FORMAT  # Import the PlanetAssistant class
+from src_py.HttpClient import open_stream, relay_stream, close_async_client
+from src_py.SessionStore import get_session_store, new_session_id
+from src_py.PlanetIndex import QuantileIndex, SIZE_QUANTILES
+from src_py.ImageCache import ImageCache, cache_key
+from src_py.PreviewStore import PreviewStore
+from src_py.TexturePool import TexturePool
+from src_py.Textures import IMAGE_PROMPT_TEMPLATE, uploader, normalize_features, create_texture
+from src_py.ImageWorkers import image_pool, PoolBusyError
+from src_py.SingleFlight import SingleFlight
+from src_py.RateGovernor import UpstreamError
+from src_py.JobQueue import JobQueue, JobFailed, QueueFullError, get_job_store, FINISHED, SUCCEEDED
+from src_py.PlanetGenerator import estimate_planet_parameters_batch, map_features_to_text_batch
+import numpy as np
+from starlette.responses import StreamingResponse, Response, PlainTextResponse, JSONResponse
 from dotenv import load_dotenv, find_dotenv
-import cloudinary.uploader as uploader
-import cloudinary
-from typing import List
-from pydantic import BaseModel
-from src_py.GptAssistant import Chatbot
-
-cloudinary.config(
-  cloud_name = "api",
-  api_key = "api",
-  api_secret = "api",
-  secure = True
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, Field
+from src_py.ServerSentEvents import sse_event
+from src_py.CatalogStore import CatalogStore, STRING_COLUMNS
+from src_py.SimilarPlanets import SimilarityIndex, generated_planet_features
+from src_py.SearchIndex import SearchIndex
+from src_py.Ephemeris import orbit_positions, POSITION_DTYPE
+from src_py.Startup import LazyResource, ResourceUnavailable, warm_up, readiness
+from src_py.Metrics import (
+    span, start_request_spans, server_timing, render_metrics, REQUEST_SECONDS, REQUESTS_IN_FLIGHT
 )
 
+logger = logging.getLogger(__name__)
+
 # Load environment variables (e.g., OpenAI API key)
 load_dotenv(find_dotenv())
-openai.api_key = os.getenv('OPENAI_API_KEY')
 
-# Load your data
-df = pd.read_csv('Data/merged.csv')
+
+# Build the quantile index over the dataset once; it rebuilds itself if the file changes
+planet_index = LazyResource('planet_index', lambda: QuantileIndex('Data/merged.csv'))
+
+@asynccontextmanager
+async def lifespan(app):
+    await job_queue.start()
+    # Load the datasets, indexes and clients in the background so the worker can answer at once
+    warm_up_task = asyncio.create_task(warm_up(resources))
+    yield
+    # Stop the warm-up, job workers and pool refills, then release the upstream connections and image workers
+    warm_up_task.cancel()
+    await job_queue.stop()
+    await texture_pool.stop()
+    await close_async_client()
+    image_pool.shutdown()
+
 
 # Initialize the FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Enable CORS
 app.add_middleware(
@@ -38,16 +70,68 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],  # Allows all HTTP methods
     allow_headers=["*"],  # Allows all headers
+    # Lets the frontend read the session of a new conversation and the ephemeris buffer layout
+    expose_headers=[
+        "X-Session-Id", "X-Planet-Count", "X-Sample-Count", "X-Time-Start-Days", "X-Time-Step-Days", "Server-Timing",
+        "Location"
+    ],
 )
 
-# Create a global instance of PlanetAssistant that can be switched
-current_assistant = PlanetAssistant()
 
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, error: UpstreamError):
+    """Report OpenAI rate limiting and outages as 429/503 with Retry-After instead of a 500."""
+    return JSONResponse({"detail": error.detail}, status_code=error.client_status, headers=error.headers)
+
+
+@app.exception_handler(ResourceUnavailable)
+async def resource_unavailable_handler(request: Request, error: ResourceUnavailable):
+    """Answer 503 with Retry-After while a dataset or client the route needs failed to load."""
+    return JSONResponse(
+        {"detail": str(error)}, status_code=503, headers={"Retry-After": str(max(1, round(error.retry_after)))}
+    )
+
+
+@app.middleware("http")
+async def record_timings(request: Request, call_next):
+    """
+    Time every request, and report the stages it ran (see Metrics.span) in a Server-Timing
+    header. Streaming responses report the stages finished before their headers were sent.
+    """
+    spans = start_request_spans()
+    REQUESTS_IN_FLIGHT.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+    finally:
+        REQUESTS_IN_FLIGHT.dec()
+        elapsed = time.perf_counter() - start
+        # Label by route template so /systems/{star_name} is one series, not one per star
+        route = request.scope.get('route')
+        REQUEST_SECONDS.observe(elapsed, request.method, route.path if route else 'unmatched', status)
+    spans.append(('total', elapsed))
+    response.headers['Server-Timing'] = server_timing(spans)
+    return response
+
+# Column-oriented copy of the exoplanet catalogue served to the Galaxy-3js pages
+catalog = LazyResource('catalog', CatalogStore)
+similarity_index = LazyResource('similarity_index', lambda: SimilarityIndex(catalog.get()))
+search_index = LazyResource('search_index', lambda: SearchIndex(catalog.get()))
+
+# Conversation states keyed by session ID, shared across workers when SESSION_BACKEND=sqlite
+session_store = get_session_store()
 
 
 # Define the request models
 class UserInputModel(BaseModel):
     user_input: str
+    session_id: Optional[str] = None
+    preview: bool = False  # Answer with a fast preview; /finalize_conversation/ renders the full image
+
+class SessionModel(BaseModel):
+    session_id: str
 
 class FeaturesModel(BaseModel):
     temperature: str
@@ -57,145 +141,669 @@ class FeaturesModel(BaseModel):
 class MessagePayload(BaseModel):
     message: str
     id: str = None
-# Helper function to save conversation
+
+class PlanetFeaturesModel(BaseModel):
+    planet_size: str = 'medium'
+    temperature: str = 'temperate'
+    type: str = 'rocky'
+    color: str = 'unknown'
+
+class BatchPlanetsModel(BaseModel):
+    features: Optional[PlanetFeaturesModel] = None
+    features_list: Optional[List[PlanetFeaturesModel]] = None
+    n: int = Field(1, ge=1, le=10000)  # Candidates generated per feature set
+    seed: Optional[int] = None
+    describe: bool = False
+
+class SimilarPlanetsModel(BaseModel):
+    planet: Optional[Dict[str, Any]] = None  # Catalogue feature vector or a generated planet
+    planets: Optional[List[Dict[str, Any]]] = None  # Batch of the above
+    session_id: Optional[str] = None  # Use the planet of a conversation
+    k: int = Field(5, ge=1, le=100)
+
+# Upper bound on the number of planets a single batch request may produce
+MAX_BATCH_PLANETS = 100000
+
+
+async def load_assistant(session_id):
+    """
+    Build a PlanetAssistant holding the stored conversation state of a session. The store is
+    read in a worker thread, since the SQLite backend may block on a locked database.
+    """
+    state = await run_in_threadpool(session_store.get, session_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired session")
+    assistant = PlanetAssistant()
+    assistant.conversation_state = state
+    return assistant
 
 @app.post("/switch_convo/")
 def switch_convo():
     """
-    Switch to a new conversation by creating a new PlanetAssistant instance.
+    Switch to a new conversation by creating a new session.
+    """
+    session_id = new_session_id()
+    session_store.set(session_id, {})
+    return {"message": "Switched to a new conversation. You can now start fresh.", "session_id": session_id}
+
+# Latest preview image of each conversation, edited by follow-up preview requests
+preview_store = PreviewStore()
+
+
+async def final_image_response(assistant, session_id):
+    """
+    Render the full-quality image of a conversation afresh and relay it chunk by chunk as it
+    downloads. The stored preview no longer shows the conversation and is dropped.
     """
-    global current_assistant
-    current_assistant = PlanetAssistant()  # Create a new instance of PlanetAssistant
-    return {"message": "Switched to a new conversation. You can now start fresh."}
+    await run_in_threadpool(preview_store.discard, session_id)
+    image_url = await assistant.finalize_conversation_async()
+    if not image_url:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+    upstream = await open_stream(image_url)
+    if upstream is None:
+        raise HTTPException(status_code=500, detail="Failed to download the image")
+    return StreamingResponse(
+        relay_stream(upstream),
+        media_type=upstream.headers.get('content-type', 'image/png'),
+        headers={"X-Session-Id": session_id}
+    )
+
+
+async def preview_response(assistant, session_id, addition=None):
+    """
+    Render a preview of a conversation, editing its previous preview when there is an addition,
+    and store it as the base of the next edit.
+    """
+    previous = await run_in_threadpool(preview_store.get, session_id) if addition else None
+    image = await assistant.preview_conversation_async(previous, addition)
+    if not image:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+    await run_in_threadpool(preview_store.put, session_id, image)
+    return Response(image, media_type=f"image/{PREVIEW_IMAGE_FORMAT}", headers={"X-Session-Id": session_id})
+
+
+async def finalize_response(assistant, session_id):
+    """
+    Upgrade the last preview of a conversation to full quality so the final image matches what
+    the user approved, and store it as the base of further edits. Conversations without a
+    preview are rendered afresh.
+    """
+    preview = await run_in_threadpool(preview_store.get, session_id)
+    if not preview:
+        return await final_image_response(assistant, session_id)
+    image = await assistant.finalize_preview_image_async(preview)
+    if not image:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+    await run_in_threadpool(preview_store.put, session_id, image)
+    return Response(image, media_type=f"image/{PREVIEW_IMAGE_FORMAT}", headers={"X-Session-Id": session_id})
+
 
 @app.post("/start_of_conversation/")
 async def start_of_conversation(user_input: UserInputModel):
     """
-    Start the conversation using the globally tracked PlanetAssistant.
+    Start the conversation for the given session, creating a new session if none is provided.
+    With `preview` set, a fast low-quality preview is returned instead of the final image.
     """
-    global current_assistant
+    session_id = user_input.session_id or new_session_id()
+    assistant = PlanetAssistant()
     try:
         # Start the conversation with the provided user input
-        current_assistant.start_conversation(user_input.user_input, df)
-        # Finalize and get the image URL
-        image_url = current_assistant.finalize_conversation()
-        if image_url:
-            # Download the image from the URL
-            response = requests.get(image_url)
-            if response.status_code == 200:
-                # Read the image content
-                img = BytesIO(response.content)
-                # Save the conversation to MongoDB
-                # Return the image as a streaming response
-                return StreamingResponse(img, media_type="image/png")
-            else:
-                raise HTTPException(status_code=500, detail="Failed to download the image")
-        else:
-            raise HTTPException(status_code=500, detail="Image generation failed")
+        await assistant.start_conversation_async(
+            user_input.user_input, await planet_index.get_async(), (await catalog.get_async()).host_stars
+        )
+        await run_in_threadpool(session_store.set, session_id, assistant.conversation_state)
+        if user_input.preview:
+            return await preview_response(assistant, session_id)
+        return await final_image_response(assistant, session_id)
+    except (HTTPException, UpstreamError, ResourceUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/continue_conversation/")
 async def continue_conversation(user_input: UserInputModel):
     """
-    Continue the conversation using the globally tracked PlanetAssistant.
+    Continue the conversation stored for the given session. With `preview` set, the previous
+    preview is edited to include the addition instead of regenerating the planet.
     """
-    global current_assistant
+    if not user_input.session_id:
+        raise HTTPException(status_code=400, detail="Session ID not provided.")
+    session_id = user_input.session_id
+    assistant = await load_assistant(session_id)
+    if 'features' not in assistant.conversation_state:
+        raise HTTPException(status_code=400, detail="Conversation has not been started.")
     try:
         # Add more information to the conversation
-        current_assistant.continue_conversation(user_input.user_input)
-
-        # Finalize and get the image URL
-        image_url = current_assistant.finalize_conversation()
-        if image_url:
-            # Download the image from the URL
-            response = requests.get(image_url)
-            if response.status_code == 200:
-                # Read the image content
-                img = BytesIO(response.content)
-                # Save the conversation to MongoDB
-                # Return the image as a streaming response
-                return StreamingResponse(img, media_type="image/png")
-            else:
-                raise HTTPException(status_code=500, detail="Failed to download the image")
-        else:
-            raise HTTPException(status_code=500, detail="Image generation failed")
+        assistant.continue_conversation(user_input.user_input)
+        await run_in_threadpool(session_store.set, session_id, assistant.conversation_state)
+        if user_input.preview:
+            return await preview_response(assistant, session_id, user_input.user_input)
+        return await final_image_response(assistant, session_id)
+    except (HTTPException, UpstreamError, ResourceUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/finalize_conversation/")
+async def finalize_conversation(payload: SessionModel):
+    """
+    Render the full-quality image of a conversation built up with previews, by upgrading its
+    last preview.
+    """
+    assistant = await load_assistant(payload.session_id)
+    if 'features' not in assistant.conversation_state:
+        raise HTTPException(status_code=400, detail="Conversation has not been started.")
+    try:
+        return await finalize_response(assistant, payload.session_id)
+    except (HTTPException, UpstreamError, ResourceUnavailable):
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Generated textures keyed by normalized features and the prompt template
+image_cache = ImageCache()
+
+# Pre-generated textures for the UI's feature space, filled by src_py.prewarm_textures
+texture_pool = TexturePool()
+
+
+# Concurrent requests for the same uncached texture share one generation
+texture_flight = SingleFlight('generate_texture')
+
+
+async def generate_texture(key, normalized):
+    """
+    Create the texture for normalized features and store it in the image cache.
+    """
+    final_url, textures, content = await create_texture(normalized)
+    logger.debug("Uploaded textures for %s: %s", key, textures)
+    await run_in_threadpool(image_cache.put, key, final_url, content, textures)
+    return {"img_url": final_url, "textures": textures}
+
+
+async def texture_for(features):
+    """
+    Return the texture URLs for a FeaturesModel: from the texture pool if the combination is
+    pre-generated (refilling it in the background), else from the image cache, generating
+    them on a miss.
+    """
+    normalized = normalize_features(features)
+    key = cache_key(normalized, IMAGE_PROMPT_TEMPLATE)
+    with span('texture_pool_lookup'):
+        pooled = await run_in_threadpool(texture_pool.take, key)
+    if pooled:
+        texture_pool.refill_later(key, normalized, create_texture)
+        return pooled
+    with span('image_cache_lookup'):
+        cached = await run_in_threadpool(image_cache.get, key)
+    if cached:
+        return {"img_url": cached['img_url'], "textures": cached['textures']}
+    return await texture_flight.do(key, generate_texture, key, normalized)
+
 
 @app.post("/generate_image/")
 async def generate_image(features: FeaturesModel):
     """
     Generate an image based on the provided features using the predefined prompt.
+    Pre-generated combinations are served from the texture pool and repeated ones from the
+    image cache, and identical requests arriving while one is being generated wait for and
+    share its result.
     """
-    second_assistant = PlanetAssistant()
-
     try:
-        # Extract values from the features
-        temperature = features.temperature or 'temperate'
-        planet_type = ", ".join(features.types or 'terrestrial')
-        color = features.color or 'earthy'
-
-        # Predefined prompt with placeholders
-        prompt_template = (
-            "The image presents a panoramic view of a [temperature] [type] planet, "
-            "highlighted in a palette of [color] tones. It captures the dynamic and complex "
-            "surface and atmospheric features, conveying a sense of depth and motion. "
-            "The planet is centrally positioned in the composition. don't generate any shadows in this picture."
-        )
-        print("mihvelet")
-        # Replace placeholders with actual values
-        prompt = prompt_template.replace('[temperature]', temperature)
-        prompt = prompt.replace('[type]', planet_type)
-        prompt = prompt.replace('[color]', color)
-
-        # Generate the image URL
-        print(prompt)
-        image_url = second_assistant.generate_dalle_image(prompt=prompt)
-        print(image_url)
-
-        # Preprocess the image
-        image = second_assistant.preprocess_dalle_image(image_url)  # Use the standalone function
-
-        if image:
-            # Convert the image to bytes
-            img_bytes = BytesIO()
-            image.save(img_bytes, format='PNG')
-            img_byte_array = img_bytes.getvalue()  # Get the bytes data
-            final_url = uploader.upload(file=img_byte_array, unique_filename=True, overwrite=True)['secure_url']
-            print(final_url)
-            return {"img_url": final_url}
-        else:
-            raise HTTPException(status_code=500, detail="Image generation failed")
+        return await texture_for(features)
+    except HTTPException:
+        raise
+    except PoolBusyError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+    except (UpstreamError, ResourceUnavailable):
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-  # Import the updated Chatbot class
+def job_handler(handler):
+    """Report HTTP errors raised by a job handler as job failures with the same status code."""
+    async def run(payload):
+        try:
+            return await handler(payload)
+        except HTTPException as e:
+            raise JobFailed(e.status_code, e.detail)
+        except UpstreamError as e:
+            raise JobFailed(e.client_status, e.detail)
+        except PoolBusyError as e:
+            raise JobFailed(503, str(e))
+        except ResourceUnavailable as e:
+            raise JobFailed(503, str(e))
+    return run
+
+
+async def generate_image_job(payload):
+    return await texture_for(FeaturesModel(**payload))
+
+
+async def start_conversation_job(payload):
+    assistant = PlanetAssistant()
+    await assistant.start_conversation_async(
+        payload['user_input'], await planet_index.get_async(), (await catalog.get_async()).host_stars
+    )
+    await run_in_threadpool(session_store.set, payload['session_id'], assistant.conversation_state)
+    await run_in_threadpool(preview_store.discard, payload['session_id'])
+    image_url = await assistant.finalize_conversation_async()
+    if not image_url:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+    return {"img_url": image_url, "session_id": payload['session_id']}
+
 
-chatbot = Chatbot()
+async def continue_conversation_job(payload):
+    assistant = await load_assistant(payload['session_id'])
+    assistant.continue_conversation(payload['user_input'])
+    await run_in_threadpool(session_store.set, payload['session_id'], assistant.conversation_state)
+    await run_in_threadpool(preview_store.discard, payload['session_id'])
+    image_url = await assistant.finalize_conversation_async()
+    if not image_url:
+        raise HTTPException(status_code=500, detail="Image generation failed")
+    return {"img_url": image_url, "session_id": payload['session_id']}
+
+
+# Background workers for the image generation jobs; JOB_BACKEND=sqlite keeps jobs across restarts
+job_queue = JobQueue(get_job_store(), {
+    'generate_image': job_handler(generate_image_job),
+    'start_of_conversation': job_handler(start_conversation_job),
+    'continue_conversation': job_handler(continue_conversation_job)
+})
+
+# Seconds between job state checks while streaming job events
+JOB_EVENTS_POLL_INTERVAL = 1.0
+
+
+def job_response(job):
+    """Public view of a job record."""
+    return {key: job[key] for key in ('id', 'kind', 'status', 'result', 'error', 'created_at', 'started_at', 'finished_at')}
+
+
+async def submit_job(kind, payload, headers=None):
+    """Queue a job and answer 202 with its record and a Location to poll."""
+    try:
+        job = await job_queue.submit(kind, payload)
+    except QueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "10"})
+    return JSONResponse(
+        job_response(job), status_code=202, headers={"Location": f"/jobs/{job['id']}", **(headers or {})}
+    )
+
+
+@app.post("/jobs/generate_image")
+async def generate_image_job_endpoint(features: FeaturesModel):
+    """
+    Queue /generate_image/ as a background job. Poll GET /jobs/{id} or stream
+    GET /jobs/{id}/events for the result.
+    """
+    return await submit_job('generate_image', features.model_dump())
+
+
+@app.post("/jobs/start_of_conversation")
+async def start_of_conversation_job_endpoint(user_input: UserInputModel):
+    """
+    Queue the start of a conversation as a background job. The job result holds the DALL-E
+    image URL and the session ID, which is also returned right away in X-Session-Id.
+    """
+    session_id = user_input.session_id or new_session_id()
+    return await submit_job(
+        'start_of_conversation', {'user_input': user_input.user_input, 'session_id': session_id},
+        headers={"X-Session-Id": session_id}
+    )
+
+
+@app.post("/jobs/continue_conversation")
+async def continue_conversation_job_endpoint(user_input: UserInputModel):
+    """
+    Queue the continuation of a conversation as a background job.
+    """
+    if not user_input.session_id:
+        raise HTTPException(status_code=400, detail="Session ID not provided.")
+    if 'features' not in (await load_assistant(user_input.session_id)).conversation_state:
+        raise HTTPException(status_code=400, detail="Conversation has not been started.")
+    return await submit_job(
+        'continue_conversation', {'user_input': user_input.user_input, 'session_id': user_input.session_id},
+        headers={"X-Session-Id": user_input.session_id}
+    )
 
 
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Return the status of a job, with its result or error once it has finished."""
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+    return job_response(job)
+
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str):
+    """
+    Stream a job's progress as Server-Sent Events: a `status` event whenever its status
+    changes, then `done` with the finished job or `error` if it failed.
+    """
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Unknown or expired job")
+
+    async def events(job):
+        status = None
+        while True:
+            if job is None:
+                yield sse_event({"detail": "Unknown or expired job", "id": job_id}, event="error")
+                return
+            if job['status'] in FINISHED:
+                yield sse_event(job_response(job), event="done" if job['status'] == SUCCEEDED else "error")
+                return
+            if job['status'] != status:
+                status = job['status']
+                yield sse_event(job_response(job), event="status")
+            await job_queue.wait(job_id, JOB_EVENTS_POLL_INTERVAL)
+            job = await job_queue.get(job_id)
+
+    return StreamingResponse(
+        events(job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def load_chatbot():
+    """Create the assistant chatbot, which imports the OpenAI SDK and may call the API."""
+    from src_py.GptAssistant import Chatbot  # Import the updated Chatbot class
+    return Chatbot()
+
+
+chatbot = LazyResource('chatbot', load_chatbot, required=False)
+
 
 @app.post("/message")
-def send_message(payload: MessagePayload):
+async def send_message(payload: MessagePayload):
     """Send a message to the assistant and get the response."""
     user_message = payload.message
     if not user_message:
         raise HTTPException(status_code=400, detail="Message not provided.")
 
-    if payload.id:
-        # Continue conversation with provided thread_id
-        thread_id = payload.id
-        chatbot.set_thread_id(thread_id)
-    else:
-        # Start a new conversation
-        thread_id = chatbot.start_new_conversation()
+    bot = await chatbot.get_async()
+
+    # Continue the conversation with the provided thread_id or start a new one
+    thread_id = payload.id or await bot.start_new_conversation()
 
     # Send the user message to the assistant
-    chatbot.send_message(user_message=user_message, thread_id=thread_id)
+    await bot.send_message(thread_id, user_message)
 
     # Get the assistant's response
-    assistant_response = chatbot.get_response(thread_id=thread_id)[0].text.value
+    assistant_response = await bot.get_response(thread_id)
 
     return {"assistant_response": assistant_response, "id": thread_id}
+
+
+@app.post("/message/stream")
+async def stream_message(payload: MessagePayload):
+    """
+    Send a message to the assistant and stream the reply as Server-Sent Events: one `delta`
+    message per text chunk, then a `done` event carrying the thread ID.
+    """
+    user_message = payload.message
+    if not user_message:
+        raise HTTPException(status_code=400, detail="Message not provided.")
+
+    bot = await chatbot.get_async()
+    thread_id = payload.id or await bot.start_new_conversation()
+    await bot.send_message(thread_id, user_message)
+
+    async def events():
+        try:
+            async for text in bot.stream_response(thread_id):
+                yield sse_event({"delta": text})
+        except UpstreamError as e:
+            yield sse_event({"detail": e.detail, "status_code": e.client_status, "id": thread_id}, event="error")
+            return
+        except Exception as e:
+            yield sse_event({"detail": str(e), "id": thread_id}, event="error")
+            return
+        yield sse_event({"id": thread_id}, event="done")
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.get("/message/history/{thread_id}")
+async def message_history(thread_id: str):
+    """Return the recent messages of a conversation thread, oldest first."""
+    bot = await chatbot.get_async()
+    try:
+        messages = await bot.history(thread_id)
+    except UpstreamError as e:
+        if e.status_code == 404:
+            raise HTTPException(status_code=404, detail="Thread not found.")
+        raise
+    return {"id": thread_id, "messages": messages}
+
+
+@app.post("/generate_planets/batch")
+def generate_planets_batch(payload: BatchPlanetsModel):
+    """
+    Generate `n` candidate planets for each feature set in one vectorized pass.
+    Passing the same seed reproduces the same catalogue.
+    """
+    features_list = payload.features_list or ([payload.features] if payload.features else [])
+    if not features_list:
+        raise HTTPException(status_code=400, detail="Provide features or features_list.")
+    if len(features_list) * payload.n > MAX_BATCH_PLANETS:
+        raise HTTPException(status_code=400, detail=f"A batch may contain at most {MAX_BATCH_PLANETS} planets.")
+    features_list = [features.model_dump() for features in features_list]
+    for features in features_list:
+        if features['planet_size'].lower() not in SIZE_QUANTILES:
+            raise HTTPException(status_code=400, detail=f"Unknown planet size: {features['planet_size']}")
+
+    planets = estimate_planet_parameters_batch(
+        features_list, planet_index.get(), n=payload.n, rng=np.random.default_rng(payload.seed),
+        hosts=catalog.get().host_stars
+    )
+    response = {
+        key: (np.round(values, 2) if values.dtype.kind == 'f' else values).tolist()
+        for key, values in planets.items()
+    }
+    if payload.describe:
+        response['descriptions'] = {key: values.tolist() for key, values in map_features_to_text_batch(planets).items()}
+    response['count'] = len(features_list) * payload.n
+    return response
+
+
+# Largest page /planets returns
+MAX_PLANETS_PAGE = 1000
+
+
+def catalog_response(request, payload, etag):
+    """
+    Return catalogue JSON with an ETag, answering 304 when the client already has this version
+    and gzip-compressing the body when the client accepts it.
+    """
+    etag = f'"{etag}"'
+    headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    body = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    if "gzip" in request.headers.get("accept-encoding", "") and len(body) > 512:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@app.get("/systems/{star_name}")
+def get_system(star_name: str, request: Request):
+    """
+    Return every planet orbiting the given star.
+    """
+    store = catalog.get()
+    planets = store.system(star_name)
+    if planets is None:
+        raise HTTPException(status_code=404, detail="System not found.")
+    return catalog_response(request, {"star_name": star_name, "planets": planets}, store.version)
+
+
+@app.get("/planets")
+def get_planets(request: Request, limit: int = 100, offset: int = 0):
+    """
+    Filter the catalogue. String columns are matched exactly (e.g. `discovery_method=Transit`)
+    and numeric columns, including the derived physics ones, take `min_<column>` / `max_<column>`
+    bounds (e.g. `max_planet_mass=10`, `min_equilibrium_temperature=200`).
+    """
+    if not 1 <= limit <= MAX_PLANETS_PAGE or offset < 0:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_PLANETS_PAGE}.")
+
+    store = catalog.get()
+    equals = {}
+    ranges = {}
+    try:
+        for name, value in request.query_params.items():
+            if name in STRING_COLUMNS:
+                equals[name] = value
+            elif name.startswith(('min_', 'max_')) and name[4:] in store.numeric:
+                low, high = ranges.get(name[4:], (None, None))
+                if name.startswith('min_'):
+                    low = float(value)
+                else:
+                    high = float(value)
+                ranges[name[4:]] = (low, high)
+            elif name not in ('limit', 'offset'):
+                raise HTTPException(status_code=400, detail=f"Unknown filter: {name}")
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Numeric filters must be numbers.")
+
+    total, planets = store.query(equals, ranges, limit=limit, offset=offset)
+    query = "&".join(sorted(f"{name}={value}" for name, value in request.query_params.items()))
+    etag = hashlib.sha256(f"{store.version}?{query}".encode('utf-8')).hexdigest()[:16]
+    return catalog_response(request, {"total": total, "planets": planets}, etag)
+
+
+# Largest number of planets /similar accepts in one batch
+MAX_SIMILAR_QUERIES = 1000
+
+
+@app.post("/similar")
+def similar_planets(payload: SimilarPlanetsModel):
+    """
+    Return the k closest real exoplanets for each query. A query is either a feature vector
+    keyed by catalogue column (planet_mass, planet_radius, orbital_period, orbital_eccentricity,
+    star_temperature) or a planet produced by the generator.
+    """
+    queries = list(payload.planets or [])
+    if payload.planet:
+        queries.append(payload.planet)
+    if payload.session_id:
+        state = session_store.get(payload.session_id)
+        if not state or 'features' not in state:
+            raise HTTPException(status_code=404, detail="Unknown session or conversation not started")
+        queries.append(state['features'])
+    if not queries:
+        raise HTTPException(status_code=400, detail="Provide planet, planets or session_id.")
+    if len(queries) > MAX_SIMILAR_QUERIES:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SIMILAR_QUERIES} planets per request.")
+
+    try:
+        queries = [
+            generated_planet_features(query) if 'approximate_mass_earth_masses' in query else query
+            for query in queries
+        ]
+        results = similarity_index.get().query(queries, k=payload.k)
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid planet features: {e}")
+    return {"results": results}
+
+
+# Largest number of suggestions /search returns
+MAX_SEARCH_RESULTS = 50
+
+
+@app.get("/search")
+def search_names(q: str = "", limit: int = 10):
+    """
+    Autocomplete star and planet names: names starting with `q` come first, followed by
+    close fuzzy matches so misspellings still find the intended system.
+    """
+    if not 1 <= limit <= MAX_SEARCH_RESULTS:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {MAX_SEARCH_RESULTS}.")
+    return {"results": search_index.get().search(q, limit)}
+
+
+# Most samples per planet /ephemeris computes in one request
+MAX_EPHEMERIS_SAMPLES = 4096
+
+
+@app.get("/ephemeris/{star_name}")
+def get_ephemeris(star_name: str, start: float = 0.0, days: Optional[float] = None, samples: int = 256):
+    """
+    Keplerian positions of every planet in a system over a time window, returned as a raw
+    little-endian Float32 buffer laid out as [planet][sample][x, y] in AU, with planets in the
+    same order as /systems. Samples are `days / samples` apart starting at `start`, so the
+    default window (one orbit of the slowest planet) loops seamlessly. Planets without a known
+    orbit have NaN positions.
+    """
+    store = catalog.get()
+    row_range = store.systems.get(star_name)
+    if row_range is None:
+        raise HTTPException(status_code=404, detail="System not found.")
+    if not 1 <= samples <= MAX_EPHEMERIS_SAMPLES:
+        raise HTTPException(status_code=400, detail=f"samples must be between 1 and {MAX_EPHEMERIS_SAMPLES}.")
+
+    rows = slice(*row_range)
+    period = store.numeric['orbital_period'][rows]
+    if days is None:
+        days = float(np.nanmax(period)) if np.isfinite(period).any() else 365.25
+    if not (math.isfinite(days) and days > 0):
+        raise HTTPException(status_code=422, detail="days must be a positive finite number.")
+    if not math.isfinite(start):
+        raise HTTPException(status_code=422, detail="start must be a finite number.")
+
+    step = days / samples
+    positions = orbit_positions(
+        store.numeric['semi_major_axis_au'][rows], period, store.numeric['orbital_eccentricity'][rows],
+        start + step * np.arange(samples)
+    )
+    return Response(
+        content=positions.astype(POSITION_DTYPE).tobytes(),
+        media_type="application/octet-stream",
+        headers={
+            "X-Planet-Count": str(positions.shape[0]),
+            "X-Sample-Count": str(samples),
+            "X-Time-Start-Days": repr(start),
+            "X-Time-Step-Days": repr(step)
+        }
+    )
+
+
+@app.get("/metrics")
+def metrics():
+    """
+    Expose request and per-stage latency histograms and in-flight counts in the Prometheus
+    text format.
+    """
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
+
+# Everything warmed up in the background after startup, in build order
+resources = [catalog, planet_index, similarity_index, search_index, uploader, chatbot]
+
+
+@app.get("/healthz")
+def healthz():
+    """
+    Liveness probe: the worker is up and serving, whether or not warm-up has finished.
+    """
+    return {"status": "ok"}
+
+
+@app.get("/readyz")
+def readyz():
+    """
+    Readiness probe: 200 once the datasets and indexes are loaded, 503 until then. Reports
+    the status of every lazily loaded resource, including optional ones like the chatbot.
+    """
+    ready, statuses = readiness(resources)
+    return JSONResponse({"ready": ready, "resources": statuses}, status_code=200 if ready else 503)
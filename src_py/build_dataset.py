@@ -0,0 +1,44 @@
+"""
+Convert the datasets into the memory-mapped columnar format read by the server.
+
+Usage:
+    python -m src_py.build_dataset [Data/planets.json] [Data/merged.csv]
+"""
+import os
+import sys
+from src_py.ColumnarFile import write_table, binary_path_for
+from src_py.CatalogStore import CATALOG_PATH, build_catalog_table, build_derived_table
+from src_py.PlanetIndex import build_csv_table
+
+# (builder, binary file suffix) pairs for each supported source format, built in order
+BUILDERS = {
+    '.json': ((build_catalog_table, ''), (build_derived_table, '.derived')),
+    '.csv': ((build_csv_table, ''),)
+}
+
+
+def build(source_path):
+    """Build the binary tables for one source file and return their paths and row counts."""
+    extension = os.path.splitext(source_path)[1].lower()
+    if extension not in BUILDERS:
+        raise ValueError(f"Unsupported dataset format: {source_path}")
+    built = []
+    for builder, suffix in BUILDERS[extension]:
+        table = builder(source_path)
+        path = binary_path_for(source_path, suffix)
+        write_table(path, table)
+        built.append((path, len(table)))
+    return built
+
+
+def main(paths):
+    for source_path in paths or [CATALOG_PATH, 'Data/merged.csv']:
+        if not os.path.exists(source_path):
+            print(f"Skipping {source_path}: file not found")
+            continue
+        for path, rows in build(source_path):
+            print(f"Wrote {rows} rows from {source_path} to {path} ({os.path.getsize(path)} bytes)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])
@@ -1,7 +1,9 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from fastapi.middleware.cors import CORSMiddleware
 from src_py.GptAssistant import Chatbot  # Import the updated Chatbot class
+from src_py.RateGovernor import UpstreamError
 
 app = FastAPI()
 chatbot = Chatbot()
@@ -13,31 +15,42 @@ app.add_middleware(
     allow_headers=["*"],  # Allows all headers
 )
 
+@app.exception_handler(UpstreamError)
+async def upstream_error_handler(request: Request, error: UpstreamError):
+    """Report OpenAI rate limiting and outages as 429/503 with Retry-After instead of a 500."""
+    return JSONResponse({"detail": error.detail}, status_code=error.client_status, headers=error.headers)
+
 # Define a Pydantic model for the request body
 class MessagePayload(BaseModel):
     message: str
     id: str = None  # Optional thread_id to continue conversation
 
 @app.post("/message")
-def send_message(payload: MessagePayload):
+async def send_message(payload: MessagePayload):
     """Send a message to the assistant and get the response."""
     user_message = payload.message
     if not user_message:
         raise HTTPException(status_code=400, detail="Message not provided.")
 
-
-    if payload.id:
-        # Continue conversation with provided thread_id
-        thread_id = payload.id
-        chatbot.set_thread_id(thread_id)
-    else:
-        # Start a new conversation
-        thread_id = chatbot.start_new_conversation()
+    # Continue the conversation with the provided thread_id or start a new one
+    thread_id = payload.id or await chatbot.start_new_conversation()
 
     # Send the user message to the assistant
-    chatbot.send_message(user_message=user_message, thread_id=thread_id)
+    await chatbot.send_message(thread_id, user_message)
 
     # Get the assistant's response
-    assistant_response = chatbot.get_response(thread_id=thread_id)[0].text.value
+    assistant_response = await chatbot.get_response(thread_id)
 
     return {"assistant_response": assistant_response, "id": thread_id}
+
+
+@app.get("/message/history/{thread_id}")
+async def message_history(thread_id: str):
+    """Return the recent messages of a conversation thread, oldest first."""
+    try:
+        messages = await chatbot.history(thread_id)
+    except UpstreamError as e:
+        if e.status_code == 404:
+            raise HTTPException(status_code=404, detail="Thread not found.")
+        raise
+    return {"id": thread_id, "messages": messages}
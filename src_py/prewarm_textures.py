@@ -0,0 +1,74 @@
+"""
+Pre-generate textures for the feature combinations the Galaxy-3js UI offers, so
+/generate_image/ can serve them from the texture pool without waiting for DALL-E.
+Combinations that already hold a full set of variants are skipped, so an interrupted run
+can simply be started again.
+
+Usage:
+    python -m src_py.prewarm_textures [--variants N] [--concurrency N]
+                                      [--temperatures hot,cold] [--colors red,blue] [--dry-run]
+"""
+import sys
+import asyncio
+import argparse
+from src_py.TexturePool import TexturePool, pool_combinations, POOL_TEMPERATURES, POOL_COLORS, TEXTURE_POOL_VARIANTS
+from src_py.ImageCache import cache_key
+from src_py.HttpClient import close_async_client
+from src_py.ImageWorkers import image_pool
+from src_py.Textures import IMAGE_PROMPT_TEMPLATE, create_texture
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="Fill the texture pool for the UI's feature combinations.")
+    parser.add_argument('--variants', type=int, default=TEXTURE_POOL_VARIANTS, help="variants to keep per combination")
+    parser.add_argument('--concurrency', type=int, default=4, help="textures generated at once")
+    parser.add_argument('--temperatures', default=','.join(POOL_TEMPERATURES), help="comma-separated temperature bands")
+    parser.add_argument('--colors', default=','.join(POOL_COLORS), help="comma-separated colors")
+    parser.add_argument('--dry-run', action='store_true', help="only report how many textures are missing")
+    return parser.parse_args(argv)
+
+
+async def prewarm(pool, combinations, concurrency):
+    """Generate the missing variants of every combination; returns (generated, failed) counts."""
+    slots = asyncio.Semaphore(concurrency)
+    counts = {'generated': 0, 'failed': 0}
+
+    async def fill(features):
+        key = cache_key(features, IMAGE_PROMPT_TEMPLATE)
+        for _ in range(pool.missing(key)):
+            async with slots:
+                try:
+                    img_url, textures, content = await create_texture(features)
+                except Exception as e:
+                    counts['failed'] += 1
+                    print(f"Failed {features}: {e}")
+                    return
+            await asyncio.to_thread(pool.add, key, features, img_url, content, textures)
+            counts['generated'] += 1
+            print(f"Generated {features['temperature']} {'/'.join(features['types'])} {features['color']}")
+
+    try:
+        await asyncio.gather(*(fill(features) for features in combinations))
+    finally:
+        await close_async_client()
+        image_pool.shutdown()
+    return counts['generated'], counts['failed']
+
+
+def main(argv):
+    args = parse_args(argv)
+    pool = TexturePool(variants=args.variants)
+    combinations = list(pool_combinations(
+        temperatures=[t.strip() for t in args.temperatures.split(',') if t.strip()],
+        colors=[c.strip() for c in args.colors.split(',') if c.strip()]
+    ))
+    if args.dry_run:
+        missing = sum(pool.missing(cache_key(features, IMAGE_PROMPT_TEMPLATE)) for features in combinations)
+        print(f"{len(combinations)} combinations, {missing} textures missing in {pool.directory}")
+        return
+    generated, failed = asyncio.run(prewarm(pool, combinations, args.concurrency))
+    print(f"Generated {generated} textures for {len(combinations)} combinations ({failed} failed)")
+
+
+if __name__ == '__main__':
+    main(sys.argv[1:])